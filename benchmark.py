@@ -0,0 +1,232 @@
+"""Latency benchmarks for the strategy, evaluator, sweep and analysis entry points.
+
+    python benchmark.py            # run and report regressions against the saved baseline
+    python benchmark.py --save     # run and store the results as the new baseline
+"""
+import contextlib
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import eval as evaluator
+import main
+from parameter_sweeps import run_backtest
+from synthetic_prices import generate_prices
+
+# ─── User parameters ────────────────────────────────────────────────
+HISTORY_LENGTHS = (250, 750, 1500)
+UNIVERSE_SIZES  = (50, 100, 200)
+REPEATS         = 5            # minimum runs per case (best-of timing)
+MIN_CASE_TIME   = 0.5          # short cases keep repeating until they have used this many seconds
+MAX_REPEATS     = 200
+TIME_BUDGET     = 2.0          # stop repeating a case once it has used this many seconds
+REGRESSION_TOL  = 0.25         # flag cases more than 25% slower than the baseline
+MIN_DELTA_S     = 0.005        # ...and slower by at least this much
+NOISE_MULT      = 2.0          # ...and by more than this many times the run-to-run spread
+MIN_P99_US      = 50.0         # getMyPosition p99 must also rise by this much to count
+BASELINE_FILE   = "benchmarks/baseline.json"
+
+
+# ───────── timing ─────────
+@contextlib.contextmanager
+def latency_hook(module, name):
+    """Wrap module.name for the duration of the block, yielding the per-call times in ns."""
+    fn = getattr(module, name)
+    samples = []
+
+    def timed(*args, **kwargs):
+        t0 = time.perf_counter_ns()
+        out = fn(*args, **kwargs)
+        samples.append(time.perf_counter_ns() - t0)
+        return out
+
+    setattr(module, name, timed)
+    try:
+        yield samples
+    finally:
+        setattr(module, name, fn)
+
+
+def latency_stats(samples_ns):
+    us = np.asarray(samples_ns, dtype=float) / 1e3
+    return {
+        "calls": int(us.size),
+        "p50_us": float(np.percentile(us, 50)),
+        "p99_us": float(np.percentile(us, 99)),
+        "max_us": float(us.max()),
+    }
+
+
+def best_of(fn, repeats=REPEATS, min_time=MIN_CASE_TIME, budget=TIME_BUDGET):
+    """Time repeated runs of fn; returns ({"seconds", "spread", "runs"}, last result).
+
+    seconds is the best run and spread the median minus the best. Short cases run at least
+    repeats times and until min_time is used; slow cases stop once budget is spent.
+    """
+    times = []
+    while len(times) < MAX_REPEATS:
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+        spent = sum(times)
+        if spent > budget or (len(times) >= repeats and spent >= min_time):
+            break
+    times = np.array(times)
+    best = float(times.min())
+    return {"seconds": best, "spread": float(np.median(times)) - best, "runs": int(times.size)}, out
+
+
+# ───────── cases ─────────
+def bench_strategy(prices):
+    """calcPL (loop, with a latency hook on getMyPosition), calcPL vectorized and run_backtest."""
+    n_inst, n_days = prices.shape
+    tag = f"n{n_inst}_d{n_days}"
+    results = {}
+
+    # best-of timing for calcPL; latencies from every getMyPosition call across the repeats
+    with latency_hook(evaluator, "getMyPosition") as samples:
+        def loop():
+            main._live = None
+            return evaluator.calcPL(prices, n_days - 1)
+        timing, _ = best_of(loop)
+    results[f"calcPL/{tag}"] = dict(timing, latency=latency_stats(samples))
+
+    timing, _ = best_of(lambda: evaluator.calcPL(prices, n_days - 1, vectorized=True))
+    results[f"calcPL_vectorized/{tag}"] = timing
+
+    timing, _ = best_of(lambda: run_backtest(prices, n_days - 1, main.LOOKBACK, main.THRESH))
+    results[f"run_backtest/{tag}"] = timing
+    return results
+
+
+def bench_analysis(prices):
+    """Main market_analyser sections on synthetic returns (the module itself analyses the 2025 file)."""
+    import market_analyser as ma
+
+    n_inst, n_days = prices.shape
+    tag = f"n{n_inst}_d{n_days}"
+    returns = pd.DataFrame(np.log(prices[:, 1:] / prices[:, :-1]).T)
+    market = returns.mean(axis=1)
+    lags = np.arange(-5, 6)
+
+    sections = {
+        "mean_rolling_autocorr": lambda: ma.mean_rolling_autocorr(market, max_window=100),
+        "autocorr_window_lag_matrix": lambda: ma.autocorr_window_lag_matrix(returns, 100, 20),
+        "rolling_acf_surface": lambda: ma.rolling_acf_surface(returns, window=100, max_lag=20),
+        "fit_ar1_batch": lambda: ma.fit_ar1_batch(returns),
+        "lead_lag_cube": lambda: ma.lead_lag_cube(returns, lags),
+    }
+    with np.errstate(invalid="ignore"):
+        return {f"{name}/{tag}": best_of(fn)[0] for name, fn in sections.items()}
+
+
+def run_suite(history_lengths=HISTORY_LENGTHS, universe_sizes=UNIVERSE_SIZES, analysis=True):
+    cases = {}
+    for n_inst in universe_sizes:
+        for n_days in history_lengths:
+            prices = generate_prices(n_inst, n_days)
+            cases.update(bench_strategy(prices))
+            if analysis:
+                cases.update(bench_analysis(prices))
+            print(f"  done n_inst={n_inst} n_days={n_days}")
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cases": cases,
+    }
+
+
+# ───────── baselines ─────────
+def save_baseline(results, path=BASELINE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tol=REGRESSION_TOL, min_delta=MIN_DELTA_S, noise_mult=NOISE_MULT):
+    """Per-case table of wall time (and getMyPosition p99) against the baseline.
+
+    A case regresses when it is more than tol slower and the slowdown also exceeds both
+    min_delta and noise_mult times the larger run-to-run spread of the two runs; a p99
+    latency regression must likewise exceed MIN_P99_US. Cases missing from either run are
+    skipped, so the table is empty when the two runs share no cases.
+    """
+    rows = []
+    for case, cur in results["cases"].items():
+        base = baseline["cases"].get(case)
+        if base is None:
+            continue
+        row = {"case": case, "base_s": base["seconds"], "now_s": cur["seconds"],
+               "ratio": cur["seconds"] / base["seconds"],
+               "noise_s": max(base.get("spread", 0.0), cur.get("spread", 0.0))}
+        if "latency" in cur and "latency" in base:
+            row["p99_ratio"] = cur["latency"]["p99_us"] / base["latency"]["p99_us"]
+            row["p99_delta_us"] = cur["latency"]["p99_us"] - base["latency"]["p99_us"]
+        rows.append(row)
+
+    columns = ["case", "base_s", "now_s", "ratio", "noise_s"]
+    table = pd.DataFrame(rows, columns=columns + [c for c in ("p99_ratio", "p99_delta_us")
+                                                  if any(c in r for r in rows)]).set_index("case")
+    floor = np.maximum(min_delta, noise_mult * table["noise_s"])
+    table["regressed"] = (table["ratio"] > 1 + tol) & (table["now_s"] - table["base_s"] > floor)
+    if "p99_ratio" in table:
+        table["regressed"] |= (table["p99_ratio"] > 1 + tol) & (table["p99_delta_us"] > MIN_P99_US)
+    return table
+
+
+# ───────── main ─────────
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark strategy, evaluator and analysis code.")
+    parser.add_argument("--save", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON path")
+    parser.add_argument("--days", type=int, nargs="+", default=HISTORY_LENGTHS, help="history lengths")
+    parser.add_argument("--universes", type=int, nargs="+", default=UNIVERSE_SIZES,
+                        help="numbers of instruments")
+    parser.add_argument("--no-analysis", action="store_true", help="skip market_analyser sections")
+    args = parser.parse_args()
+
+    print("Running benchmarks...")
+    results = run_suite(args.days, args.universes, not args.no_analysis)
+
+    print("===== getMyPosition latency (inside calcPL) =====")
+    for case, res in results["cases"].items():
+        if "latency" in res:
+            lat = res["latency"]
+            print(f"{case:<24} calls={lat['calls']:<6} p50={lat['p50_us']:8.1f}us "
+                  f"p99={lat['p99_us']:8.1f}us max={lat['max_us']:8.1f}us")
+
+    baseline = load_baseline(args.baseline)
+    if baseline is not None:
+        table = compare(results, baseline)
+        print("===== vs baseline =====")
+        if table.empty:
+            print(f"No cases in common with {args.baseline}")
+        else:
+            print(table.to_string(float_format=lambda x: f"{x:.4f}"))
+            n_bad = int(table["regressed"].sum())
+            print(f"{n_bad} regression(s) beyond {REGRESSION_TOL:.0%}")
+    else:
+        print(f"No baseline at {args.baseline}; run with --save to create one")
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to: {args.baseline}")
@@ -0,0 +1,147 @@
+"""Block / stationary bootstrap confidence intervals for backtest P&L.
+
+Resamples are drawn as one (n_resamples, n_days) index array and every statistic is a
+vectorised reduction over its rows, so 10k resamples of a 1500-day P&L take a fraction of
+a second. Daily P&L can be a 1-D array or per-instrument (nInst, days); per-instrument
+P&L is resampled by day and summed into the portfolio.
+"""
+import numpy as np
+import pandas as pd
+
+# ─── User parameters ────────────────────────────────────────────────
+prices_file  = "price_files/2025_prices.txt"
+test_days    = 1500
+n_resamples  = 10000
+block_len    = 20          # mean block length (stationary) / block length (moving block)
+alpha        = 0.05        # two-sided, so 95% intervals
+
+
+# ───────── resample indices ─────────
+def stationary_indices(n, n_resamples, mean_block, rng):
+    """Politis-Romano stationary bootstrap: blocks of geometric length, wrapping at the end.
+
+    Built as a cumulative sum over the flattened (n_resamples, n) array: +1 within a block, and
+    a jump from the previous block's last day to a fresh random start where a new block begins.
+    """
+    new_block = rng.random((n_resamples, n), dtype=np.float32) < 1.0 / mean_block
+    new_block[:, 0] = True
+    pos = np.flatnonzero(new_block)
+    starts = rng.integers(0, n, size=pos.size, dtype=np.int32)
+    steps = np.ones(n_resamples * n, dtype=np.int32)
+    steps[pos[0]] = starts[0]
+    steps[pos[1:]] = starts[1:] - starts[:-1] - (pos[1:] - pos[:-1] - 1)
+    idx = np.cumsum(steps, dtype=np.int32).reshape(n_resamples, n)
+    idx %= n
+    return idx
+
+
+def block_indices(n, n_resamples, block_len, rng):
+    """Moving block bootstrap: fixed-length blocks from uniform starts, trimmed to n days."""
+    n_blocks = -(-n // block_len)
+    starts = rng.integers(0, n - block_len + 1, size=(n_resamples, n_blocks), dtype=np.int32)
+    idx = starts[:, :, None] + np.arange(block_len, dtype=np.int32)
+    return idx.reshape(n_resamples, -1)[:, :n]
+
+
+def resample_indices(n, n_resamples=n_resamples, method="stationary", block=block_len, seed=0):
+    rng = np.random.default_rng(seed)
+    if method == "stationary":
+        return stationary_indices(n, n_resamples, block, rng)
+    if method == "block":
+        return block_indices(n, n_resamples, block, rng)
+    raise ValueError(f"unknown method {method!r}")
+
+
+# ───────── statistics ─────────
+def _daily(pll):
+    pll = np.asarray(pll, dtype=float)
+    return pll.sum(axis=0) if pll.ndim == 2 else pll
+
+
+def _stats(mu, sigma):
+    safe = np.where(sigma > 0, sigma, 1.0)
+    return {
+        "mean": mu,
+        "std": sigma,
+        "score": mu - 0.1 * sigma,
+        "sharpe": np.where(sigma > 0, np.sqrt(249) * mu / safe, 0.0),
+    }
+
+
+def score_stats(daily):
+    """mean, std, score (mean - 0.1 * std) and annualised Sharpe of a daily P&L, as in calcPL."""
+    return _stats(daily.mean(), daily.std(ddof=0))
+
+
+def resampled_stats(daily, idx):
+    """score_stats for every row of idx, as (n_resamples,) arrays.
+
+    The series is centred first so the variance can come from one sum of squares per row
+    without cancellation (about 3x cheaper than np.std on the resampled matrix).
+    """
+    centre = daily.mean()
+    samples = (daily - centre)[idx]
+    n = idx.shape[-1]
+    m = samples.sum(axis=-1) / n
+    var = np.einsum("ij,ij->i", samples, samples) / n - m * m
+    return _stats(m + centre, np.sqrt(np.maximum(var, 0.0)))
+
+
+def _interval_table(point, boot, alpha):
+    lo, hi = 100 * alpha / 2, 100 * (1 - alpha / 2)
+    return pd.DataFrame({
+        "estimate": {k: float(point[k]) for k in point},
+        "lo": {k: float(np.percentile(boot[k], lo)) for k in boot},
+        "hi": {k: float(np.percentile(boot[k], hi)) for k in boot},
+        "se": {k: float(boot[k].std(ddof=1)) for k in boot},
+    })
+
+
+def bootstrap_ci(pll, n_resamples=n_resamples, method="stationary", block=block_len, alpha=alpha,
+                 seed=0, idx=None):
+    """Percentile intervals for mean, std, score and Sharpe of a daily P&L series.
+
+    Pass idx (from resample_indices) to reuse the same resamples across calls.
+    """
+    daily = _daily(pll)
+    if idx is None:
+        idx = resample_indices(daily.size, n_resamples, method, block, seed)
+    return _interval_table(score_stats(daily), resampled_stats(daily, idx), alpha)
+
+
+def paired_compare(pll_a, pll_b, n_resamples=n_resamples, method="stationary", block=block_len,
+                   alpha=alpha, seed=0):
+    """A minus B on the same resampled days: intervals for the difference of each statistic,
+    plus the share of resamples in which A's statistic is higher (p_a_better)."""
+    a, b = _daily(pll_a), _daily(pll_b)
+    if a.shape != b.shape:
+        raise ValueError("paired comparison needs P&L over the same days")
+    idx = resample_indices(a.size, n_resamples, method, block, seed)
+    point_a, point_b = score_stats(a), score_stats(b)
+    boot_a, boot_b = resampled_stats(a, idx), resampled_stats(b, idx)
+
+    diff = {k: boot_a[k] - boot_b[k] for k in boot_a}
+    table = _interval_table({k: point_a[k] - point_b[k] for k in point_a}, diff, alpha)
+    table["p_a_better"] = pd.Series({k: float((diff[k] > 0).mean()) for k in diff})
+    return table
+
+
+# ───────── main ─────────
+if __name__ == "__main__":
+    import time
+
+    import main
+    import price_data
+    from multi_eval import calcPLMulti, momentum_strategy
+
+    prcAll = np.ascontiguousarray(price_data.load_prices(prices_file))
+    _, pll = calcPLMulti(prcAll, test_days, [main, momentum_strategy(5, 0.002)])
+
+    t0 = time.perf_counter()
+    table = bootstrap_ci(pll[0])
+    elapsed = time.perf_counter() - t0
+    print(f"===== main strategy, {n_resamples} {block_len}-day stationary resamples ({elapsed:.2f}s) =====")
+    print(table.to_string(float_format=lambda x: f"{x:.3f}"))
+
+    print("\n===== main minus lookback-5 momentum (paired) =====")
+    print(paired_compare(pll[0], pll[1]).to_string(float_format=lambda x: f"{x:.3f}"))
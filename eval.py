@@ -1,15 +1,19 @@
 
 
+import os
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
-from main import getMyPosition
+from main import MomentumStrategy, getMyPosition, getPositionsBatch
+import price_data
 
 # ─── User parameters ────────────────────────────────────────────────
 prices_file      = "price_files/2025_prices.txt"
 test_days        = 1500       # only score the last 50 days
 comm_rate        = 0.0005
 dollar_pos_limit = 10000.0
+vectorized       = False      # whole-array backtest
+verbose          = 1          # 0 silent, 1 progress every 10%, 2 one line per day
+record_file      = "artifacts/backtest_record.npz"   # per-day record (.npz or .parquet)
 
 nInst = None
 nt = None
@@ -17,23 +21,114 @@ nt = None
 # ───────── load prices ─────────
 def load_prices(fn):
     global nInst, nt
-    df = pd.read_csv(fn, sep=r'\s+', header=None)
-    prc = df.values.T          # shape: (nInst, nt)
+    prc = price_data.load_prices(fn)   # shape: (nInst, nt)
     nInst, nt = prc.shape
     print(f"Loaded {nInst} instruments for {nt} days")
     return prc
 
+# ───────── per-day record ─────────
+RECORD_COLUMNS = ("day", "value", "pnl", "dvolume", "commission", "gross_exposure", "net_exposure",
+                  "momentum_on")
+# (nInst, days) blocks and their per-instrument column prefix in Parquet
+RECORD_BLOCKS = {"positions": "pos", "inst_gross_pnl": "gross", "inst_commission": "comm",
+                 "inst_turnover": "turn"}
+
+def newRecord(days, n_inst):
+    """Preallocated columnar record: one row per test day, plus an (nInst, days) position block."""
+    rec = {col: np.zeros(len(days)) for col in RECORD_COLUMNS}
+    rec["day"] = np.asarray(days)
+    rec["momentum_on"] = np.zeros(len(days), dtype=bool)
+    rec["positions"] = np.zeros((n_inst, len(days)), dtype=int)
+    return rec
+
+def attributeRecord(rec, price, comm=comm_rate):
+    """Fill the per-instrument attribution cube of a record from its positions, in place.
+
+    price is (nInst, days) aligned with the record. Day t's gross P&L comes from the position
+    held since day t-1; its turnover and commission from the trade made on day t. Summed over
+    instruments, gross minus commission is the record's pnl column.
+    """
+    pos = rec["positions"]
+    held = np.concatenate([np.zeros_like(pos[:, :1]), pos[:, :-1]], axis=1)
+    rec["inst_gross_pnl"] = held * np.diff(price, axis=1, prepend=price[:, :1])
+    rec["inst_turnover"] = np.abs(pos - held) * price
+    rec["inst_commission"] = comm * rec["inst_turnover"]
+    # the strategy holds every instrument or none, so any open position means momentum is on
+    rec["momentum_on"] = (pos != 0).any(axis=0)
+    return rec
+
+def attributionSummary(rec):
+    """Per-instrument totals of the attribution cube, with long/short and momentum on/off splits.
+
+    Gross P&L is split by the side and regime of the position held; commission by the side
+    traded into (or out of, when going flat) and the regime on the trade day.
+    """
+    import pandas as pd
+    pos = rec["positions"]
+    held = np.concatenate([np.zeros_like(pos[:, :1]), pos[:, :-1]], axis=1)
+    gross, cost = rec["inst_gross_pnl"], rec["inst_commission"]
+    trade_side = np.where(pos != 0, np.sign(pos), np.sign(held))
+    held_on = np.concatenate([[False], rec["momentum_on"][:-1]])
+    on = rec["momentum_on"]
+
+    return pd.DataFrame({
+        "gross_pnl":      gross.sum(axis=1),
+        "commission":     cost.sum(axis=1),
+        "net_pnl":        gross.sum(axis=1) - cost.sum(axis=1),
+        "turnover":       rec["inst_turnover"].sum(axis=1),
+        "long_pnl":       (gross * (held > 0)).sum(axis=1) - (cost * (trade_side > 0)).sum(axis=1),
+        "short_pnl":      (gross * (held < 0)).sum(axis=1) - (cost * (trade_side < 0)).sum(axis=1),
+        "mom_on_pnl":     (gross * held_on).sum(axis=1) - (cost * on).sum(axis=1),
+        "mom_off_pnl":    (gross * ~held_on).sum(axis=1) - (cost * ~on).sum(axis=1),
+    }).rename_axis("instrument")
+
+def saveRecord(path, rec):
+    """Write a record as .npz, or as .parquet (one column per field, <prefix>_<i> per block row)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".parquet"):
+        import pandas as pd
+        cols = {col: rec[col] for col in RECORD_COLUMNS}
+        for block, prefix in RECORD_BLOCKS.items():
+            if block in rec:
+                cols.update({f"{prefix}_{i}": row for i, row in enumerate(rec[block])})
+        pd.DataFrame(cols).to_parquet(path, index=False)
+    else:
+        np.savez(path, **rec)
+
+def loadRecord(path):
+    if path.endswith(".parquet"):
+        import pandas as pd
+        df = pd.read_parquet(path)
+        rec = {col: df[col].to_numpy() for col in RECORD_COLUMNS}
+        for block, prefix in RECORD_BLOCKS.items():
+            block_cols = [c for c in df.columns
+                          if c.startswith(prefix + "_") and c[len(prefix) + 1:].isdigit()]
+            if block_cols:
+                rec[block] = df[block_cols].to_numpy().T
+        return rec
+    with np.load(path) as f:
+        return {k: f[k] for k in f.files}
+
 # ───────── P/L calculator ─────────
-def calcPL(prcHist, numTestDays):
+def calcPL(prcHist, numTestDays, vectorized=False, verbose=0, record=False):
+    """Backtest the last numTestDays; returns (mu, ret, sigma, sharpe, totDVolume, pll).
+
+    With record=True the per-day record (see newRecord), including its per-instrument
+    attribution cube (see attributeRecord), is appended to the tuple.
+    """
+    if vectorized:
+        return calcPLVectorized(prcHist, numTestDays, verbose, record)
+
     cash = 0.0
-    curPos = np.zeros(nInst)
+    curPos = np.zeros(prcHist.shape[0])
     totDVolume = 0.0
     value = 0.0
-    dailyPL = []
     _, nt_local = prcHist.shape
     startDay = nt_local - numTestDays + 1
+    rec = newRecord(np.arange(startDay, nt_local + 1), prcHist.shape[0])
+    report_every = max(1, numTestDays // 10) if verbose == 1 else 1
 
-    for t in range(startDay, nt_local + 1):
+    for i, t in enumerate(range(startDay, nt_local + 1)):
         hist = prcHist[:, :t]
         price = hist[:, -1]
 
@@ -44,19 +139,157 @@ def calcPL(prcHist, numTestDays):
 
             delta = newPos - curPos
             traded = np.abs(delta) * price
-            totDVolume += traded.sum()
-            cash -= price.dot(delta) + comm_rate * traded.sum()
+            dvolume = traded.sum()
+            totDVolume += dvolume
+            cash -= price.dot(delta) + comm_rate * dvolume
             curPos = newPos.copy()
+            rec["dvolume"][i] = dvolume
+            rec["commission"][i] = comm_rate * dvolume
 
         posValue = curPos.dot(price)
         todayPL = cash + posValue - value
         value = cash + posValue
 
-        if t > startDay:
+        rec["value"][i] = value
+        rec["pnl"][i] = todayPL
+        rec["gross_exposure"][i] = np.abs(curPos).dot(price)
+        rec["net_exposure"][i] = posValue
+        rec["positions"][:, i] = curPos
+
+        if verbose and t > startDay and (i % report_every == 0 or t == nt_local):
             print(f"Day {t}: value={value:.2f}, todayPL={todayPL:.2f}, totalVol={totDVolume:.0f}")
-            dailyPL.append(todayPL)
 
-    pll = np.array(dailyPL)
+    pll = rec["pnl"][1:]
+    mu = pll.mean()
+    sigma = pll.std(ddof=0)
+    sharpe = np.sqrt(249) * mu / sigma if sigma > 0 else 0.0
+    ret = value / totDVolume if totDVolume > 0 else 0.0
+    if record:
+        attributeRecord(rec, prcHist[:, startDay - 1:])
+        return mu, ret, sigma, sharpe, totDVolume, pll, rec
+    return mu, ret, sigma, sharpe, totDVolume, pll
+
+def plFromPositions(price, rawPos, comm=comm_rate, limit=dollar_pos_limit):
+    """Whole-array calcPL accounting for one or many position paths.
+
+    price is (..., nInst, T+1) over the test window and rawPos is (..., nInst, T), the position
+    requested on each day but the last; leading axes are independent runs and broadcast.
+    Returns daily P&L (..., T), total traded dollar volume (...) and final value (...).
+    """
+    tradePrice = price[..., :-1]
+    pos_limit = np.floor(limit / tradePrice).astype(int)
+    newPos = np.clip(rawPos, -pos_limit, pos_limit)
+    delta = np.diff(newPos, axis=-1, prepend=0)
+    traded = (np.abs(delta) * tradePrice).sum(axis=-2)
+    totDVolume = traded.sum(axis=-1)
+    cash = -np.cumsum((tradePrice * delta).sum(axis=-2) + comm * traded, axis=-1)
+
+    # the final day holds the last position and cash without trading
+    curPos = np.concatenate([newPos, newPos[..., -1:]], axis=-1)
+    cash = np.concatenate([cash, cash[..., -1:]], axis=-1)
+    value = cash + (curPos * price).sum(axis=-2)
+    return np.diff(value, axis=-1), totDVolume, value[..., -1]
+
+def recordFromPositions(days, price, rawPos, comm=comm_rate, limit=dollar_pos_limit):
+    """Per-day record (see newRecord) for one run, as whole-array operations.
+
+    price is (nInst, T+1) over the test window and rawPos is (nInst, T), as for plFromPositions.
+    """
+    tradePrice = price[:, :-1]
+    pos_limit = np.floor(limit / tradePrice).astype(int)
+    newPos = np.clip(rawPos, -pos_limit, pos_limit)
+    curPos = np.concatenate([newPos, newPos[:, -1:]], axis=1)
+    dvolume = np.append((np.abs(np.diff(newPos, axis=1, prepend=0)) * tradePrice).sum(axis=0), 0.0)
+
+    rec = newRecord(days, price.shape[0])
+    rec["positions"][:] = curPos
+    rec["dvolume"][:] = dvolume
+    rec["commission"][:] = comm * dvolume
+    rec["net_exposure"][:] = (curPos * price).sum(axis=0)
+    rec["gross_exposure"][:] = (np.abs(curPos) * price).sum(axis=0)
+    pll, _, _ = plFromPositions(price, rawPos, comm, limit)
+    rec["pnl"][0] = -rec["commission"][0]
+    rec["pnl"][1:] = pll
+    rec["value"][:] = np.cumsum(rec["pnl"])
+    return attributeRecord(rec, price, comm)
+
+def calcPLVectorized(prcHist, numTestDays, verbose=0, record=False):
+    """Same accounting as the calcPL loop, done as whole-array operations over the test window."""
+    _, nt_local = prcHist.shape
+    startDay = nt_local - numTestDays + 1
+
+    # prices on days startDay..nt_local; trades happen on every day but the last
+    price = prcHist[:, startDay - 1:]
+    rawPos = getPositionsBatch(prcHist[:, :-1])[:, startDay - 1:]
+    pll, totDVolume, value = plFromPositions(price, rawPos)
+    if verbose:
+        print(f"Days {startDay}-{nt_local}: value={value:.2f}, totalVol={totDVolume:.0f}")
+
+    mu = pll.mean()
+    sigma = pll.std(ddof=0)
+    sharpe = np.sqrt(249) * mu / sigma if sigma > 0 else 0.0
+    ret = value / totDVolume if totDVolume > 0 else 0.0
+    if record:
+        rec = recordFromPositions(np.arange(startDay, nt_local + 1), price, rawPos)
+        return mu, ret, sigma, sharpe, totDVolume, pll, rec
+    return mu, ret, sigma, sharpe, totDVolume, pll
+
+# ───────── streaming P/L calculator ─────────
+def calcPLStreaming(fn, numTestDays, chunk_days=256, verbose=0):
+    """calcPL over a price file without holding its history in memory.
+
+    Days are read in chunks from the memory-mapped store and fed to an incremental
+    MomentumStrategy, which keeps only its trailing windows, so memory is bounded by
+    chunk_days x nInst (a missing store is built from the text in fixed-size blocks too).
+    Same per-day accounting as the calcPL loop; each day's prices are a strided column, as
+    in calcPL on the C-ordered array load_prices returns, so the dot products are summed the
+    same way and the results match it bit for bit.
+    """
+    prices = price_data.load_prices(fn)   # memory-mapped (nInst, nt)
+    n_inst, nt_local = prices.shape
+    startDay = nt_local - numTestDays + 1
+    strategy = MomentumStrategy(n_inst)
+
+    cash = 0.0
+    curPos = np.zeros(n_inst)
+    totDVolume = 0.0
+    value = 0.0
+    pll = np.zeros(numTestDays - 1)
+    report_every = max(1, numTestDays // 10) if verbose == 1 else 1
+
+    # at least two columns, so a day is never a unit-stride vector (BLAS sums those differently)
+    buf = np.empty((n_inst, max(chunk_days, 2)))
+    for c0 in range(0, nt_local, chunk_days):
+        k = min(chunk_days, nt_local - c0)
+        buf[:, :k] = prices[:, c0:c0 + k]
+        chunk = buf[:, :k]
+        for j in range(k):
+            t = c0 + j + 1   # days of history seen, as in calcPL
+            price = chunk[:, j]
+            rawPos = strategy.update(price)
+            if t < startDay:
+                continue
+
+            if t < nt_local:
+                pos_limit = np.floor(dollar_pos_limit / price).astype(int)
+                newPos = np.clip(rawPos, -pos_limit, pos_limit)
+
+                delta = newPos - curPos
+                traded = np.abs(delta) * price
+                dvolume = traded.sum()
+                totDVolume += dvolume
+                cash -= price.dot(delta) + comm_rate * dvolume
+                curPos = newPos.copy()
+
+            posValue = curPos.dot(price)
+            todayPL = cash + posValue - value
+            value = cash + posValue
+
+            if t > startDay:
+                pll[t - startDay - 1] = todayPL
+                if verbose and ((t - startDay) % report_every == 0 or t == nt_local):
+                    print(f"Day {t}: value={value:.2f}, todayPL={todayPL:.2f}, totalVol={totDVolume:.0f}")
+
     mu = pll.mean()
     sigma = pll.std(ddof=0)
     sharpe = np.sqrt(249) * mu / sigma if sigma > 0 else 0.0
@@ -68,7 +301,7 @@ if __name__ == "__main__":
     prcAll = load_prices(prices_file)
 
     # run back-test on last test_days
-    mu, ret, sigma, sharpe, dvol, pll = calcPL(prcAll, test_days)
+    mu, ret, sigma, sharpe, dvol, pll, rec = calcPL(prcAll, test_days, vectorized, verbose, record=True)
     score = mu - 0.1 * sigma
 
     print("===== Summary =====")
@@ -79,9 +312,18 @@ if __name__ == "__main__":
     print(f"totDvolume:   {dvol:.0f}")
     print(f"Score:        {score:.2f}")
 
-# ─── PLOTS ─────────
-    import os
+    attr = attributionSummary(rec)
+    print("===== Attribution =====")
+    print(f"long / short: {attr['long_pnl'].sum():.0f} / {attr['short_pnl'].sum():.0f}")
+    print(f"mom on / off: {attr['mom_on_pnl'].sum():.0f} / {attr['mom_off_pnl'].sum():.0f}")
+    print(f"commission:   {attr['commission'].sum():.0f}")
+    print(f"best / worst: {attr['net_pnl'].idxmax()} / {attr['net_pnl'].idxmin()}")
+
+    if record_file:
+        saveRecord(record_file, rec)
+        print(f"Record saved to: {record_file}")
 
+# ─── PLOTS ─────────
     # Ensure the plot directory exists
     plot_dir = "plots"
     if not os.path.exists(plot_dir):
@@ -0,0 +1,166 @@
+"""Walk-forward testing, Monte Carlo robustness checks and multi-dataset runs built on eval."""
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import price_data
+from eval import calcPL, plFromPositions
+from main import getPositionsBatch
+from parameter_sweeps import sweep_tensorized
+
+# ─── User parameters ────────────────────────────────────────────────
+prices_file = "price_files/2025_prices.txt"
+all_files   = sorted(glob.glob("price_files/*.txt"))   # datasets for the generalisation report
+warmup_days = 100        # history handed to the strategy before each block
+block_days  = 100        # days scored per block
+step_days   = 100        # roll forward by this many days (< block_days overlaps blocks)
+n_paths     = 1000       # perturbed paths per stress test
+stress_days = 1000       # score the last stress_days of each path
+noise_level = 0.25       # return noise, as a fraction of each stock's return std
+block_len   = 20         # days per block in the shuffle test
+
+# ───────── walk-forward ─────────
+def _score_block(task):
+    window, block, vectorized = task
+    mu, ret, sigma, sharpe, dvol, pll = calcPL(window, block + 1, vectorized)
+    return mu, sigma, sharpe, mu - 0.1 * sigma, dvol
+
+def walk_forward(prcHist, warmup, block, step, vectorized=True, n_workers=None):
+    """Score consecutive blocks of `block` days, each warm-started from the `warmup` days before it.
+
+    A block starting at day s only sees prices from s - warmup onwards, so it never replays the
+    history before its warm-up window. Blocks run concurrently in a process pool; returns one row
+    per block with its mean, std, Sharpe and score.
+    """
+    _, nt_total = prcHist.shape
+    starts = list(range(warmup, nt_total - block + 1, step))
+    tasks = [(np.array(prcHist[:, s - warmup : s + block]), block, vectorized) for s in starts]
+
+    with ProcessPoolExecutor(n_workers or os.cpu_count()) as pool:
+        rows = list(pool.map(_score_block, tasks))
+
+    table = pd.DataFrame(rows, columns=["mean", "std", "sharpe", "score", "dvol"])
+    table.insert(0, "start", starts)
+    table.insert(1, "end", [s + block - 1 for s in starts])
+    return table
+
+# ───────── stress tests ─────────
+def perturbed_paths(prcHist, kind, n, rng, noise=noise_level, block=block_len):
+    """(n, nInst, nt) price paths rebuilt from perturbed log returns of prcHist.
+
+    noise   - add Gaussian noise of `noise` x each stock's return std to every return
+    shuffle - reorder the return history in blocks of `block` days (same order for every stock)
+    shift   - circularly shift each stock's returns by its own random offset, breaking the
+              cross-sectional time alignment the index signal depends on
+    """
+    prc = np.asarray(prcHist, dtype=float)
+    rets = np.diff(np.log(prc), axis=1)
+    nInst, n_rets = rets.shape
+
+    if kind == "noise":
+        sd = rets.std(axis=1, keepdims=True)
+        paths = rets + noise * sd * rng.standard_normal((n, nInst, n_rets))
+    elif kind == "shuffle":
+        n_blocks = n_rets // block
+        order = np.argsort(rng.random((n, n_blocks)), axis=1)
+        idx = (order[:, :, None] * block + np.arange(block)).reshape(n, -1)
+        tail = np.broadcast_to(np.arange(n_blocks * block, n_rets), (n, n_rets - n_blocks * block))
+        idx = np.concatenate([idx, tail], axis=1)
+        paths = rets[:, idx].transpose(1, 0, 2)
+    elif kind == "shift":
+        offset = rng.integers(1, n_rets, size=(n, nInst, 1))
+        idx = (np.arange(n_rets) + offset) % n_rets
+        paths = np.take_along_axis(np.broadcast_to(rets, (n, nInst, n_rets)), idx, axis=2)
+    else:
+        raise ValueError(f"unknown stress test: {kind}")
+
+    log_prc = np.concatenate([np.zeros((n, nInst, 1)), np.cumsum(paths, axis=2)], axis=2)
+    return prc[:, :1] * np.exp(log_prc)
+
+def score_paths(paths, numTestDays):
+    """mu - 0.1*sigma over the last numTestDays of each path, with batched positions and P&L."""
+    startDay = paths.shape[-1] - numTestDays + 1
+    rawPos = getPositionsBatch(paths[..., :-1])[..., startDay - 1:]
+    pll, _, _ = plFromPositions(paths[..., startDay - 1:], rawPos)
+    return pll.mean(axis=-1) - 0.1 * pll.std(axis=-1, ddof=0)
+
+def stress_test(prcHist, kind, n, numTestDays, seed=0, chunk=25, **kwargs):
+    """Score distribution over n perturbed paths, generated and scored `chunk` paths at a time."""
+    rng = np.random.default_rng(seed)
+    scores = np.empty(n)
+    for lo in range(0, n, chunk):
+        hi = min(lo + chunk, n)
+        scores[lo:hi] = score_paths(perturbed_paths(prcHist, kind, hi - lo, rng, **kwargs), numTestDays)
+    return scores
+
+# ───────── all datasets ─────────
+def _summary(pll, dvol):
+    mu = pll.mean()
+    sigma = pll.std(ddof=0)
+    sharpe = np.sqrt(249) * mu / sigma if sigma > 0 else 0.0
+    return len(pll), mu, sigma, sharpe, mu - 0.1 * sigma, dvol
+
+def _eval_dataset(task):
+    fn, numTestDays, vectorized = task
+    prc = price_data.load_prices(fn)
+    nt = prc.shape[1]
+    _, _, _, _, dvol, pll = calcPL(prc, min(numTestDays or nt, nt), vectorized)
+    return pll, dvol
+
+def evaluate_datasets(files, numTestDays=None, vectorized=True, n_workers=None):
+    """calcPL on every price file in parallel (last numTestDays of each, or all of it).
+
+    Each worker loads its own file once from the binary store. Returns one row per dataset
+    plus an ALL row computed from the pooled daily P&L.
+    """
+    tasks = [(fn, numTestDays, vectorized) for fn in files]
+    with ProcessPoolExecutor(n_workers or min(len(files), os.cpu_count())) as pool:
+        results = list(pool.map(_eval_dataset, tasks))
+
+    rows = [_summary(pll, dvol) for pll, dvol in results]
+    rows.append(_summary(np.concatenate([pll for pll, _ in results]), sum(dvol for _, dvol in results)))
+    names = [os.path.basename(fn) for fn in files] + ["ALL"]
+    return pd.DataFrame(rows, index=names, columns=["days", "mean", "std", "sharpe", "score", "dvol"])
+
+def _sweep_dataset(task):
+    fn, numTestDays, lookback_range, thresh_range = task
+    prc = price_data.load_prices(fn)
+    test = min(numTestDays, prc.shape[1])
+    return sweep_tensorized(prc, test, lookback_range, thresh_range, progress=False)[:, :, 0, 0]
+
+def sweep_datasets(files, numTestDays, lookback_range, thresh_range, n_workers=None):
+    """Lookback x threshold sweep on every price file in parallel.
+
+    Returns a dict of per-dataset score grids and their mean across datasets.
+    """
+    tasks = [(fn, numTestDays, lookback_range, thresh_range) for fn in files]
+    with ProcessPoolExecutor(n_workers or min(len(files), os.cpu_count())) as pool:
+        grids = list(pool.map(_sweep_dataset, tasks))
+    per_file = {os.path.basename(fn): pd.DataFrame(g, index=lookback_range, columns=thresh_range)
+                for fn, g in zip(files, grids)}
+    return per_file, sum(per_file.values()) / len(per_file)
+
+# ───────── main ─────────
+if __name__ == "__main__":
+    prcAll = price_data.load_prices(prices_file)
+    wf = walk_forward(prcAll, warmup_days, block_days, step_days)
+
+    print("===== Walk-forward blocks =====")
+    print(wf.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    print("===== Summary =====")
+    print(f"blocks:           {len(wf)}")
+    print(f"mean score:       {wf['score'].mean():.2f}")
+    print(f"worst score:      {wf['score'].min():.2f}")
+    print(f"positive blocks:  {(wf['score'] > 0).mean():.0%}")
+
+    base = score_paths(np.asarray(prcAll, dtype=float), stress_days)
+    print(f"===== Stress tests ({n_paths} paths, last {stress_days} days) =====")
+    print(f"unperturbed score: {base:.2f}")
+    for kind in ("noise", "shuffle", "shift"):
+        sc = stress_test(prcAll, kind, n_paths, stress_days)
+        p5, p50, p95 = np.percentile(sc, [5, 50, 95])
+        print(f"{kind:8s} median={p50:8.2f}  5%={p5:8.2f}  95%={p95:8.2f}  P(score>0)={(sc > 0).mean():.0%}")
+
+    print("===== All datasets =====")
+    print(evaluate_datasets(all_files).to_string(float_format=lambda v: f"{v:.2f}"))
@@ -1,4 +1,6 @@
 """Index momentum strategy with volatility-scaled sizing."""
+import os
+
 import numpy as np
 
 
@@ -7,45 +9,194 @@ THRESH        = 0.002
 TARGET_DOLLAR = 1500
 VOL_WINDOW    = LOOKBACK  # you could also use a longer vol window
 
+BATCH_BLOCK   = 2**22     # getPositionsBatch: max elements per block of days
+VOL_RESYNC    = 256       # getPositionsBatch: max days per block (its vol sums restart each block)
+
+
+class MomentumStrategy:
+    """Incremental getMyPosition: feed one day at a time, O(1) work per day."""
+
+    def __init__(self, n_inst: int):
+        self.n_inst = n_inst
+        self.n_days = 0
+        self.last_prices = None
+
+        # ring buffer of the last LOOKBACK+1 index values
+        self.index_buf = np.zeros(LOOKBACK + 1)
+
+        # ring buffer of the last VOL_WINDOW-1 returns with running sums for the vol estimate
+        self.ret_buf = np.zeros((n_inst, VOL_WINDOW - 1))
+        self.ret_pos = 0
+        self.ret_sum = np.zeros(n_inst)
+        self.ret_sumsq = np.zeros(n_inst)
+
+    def update(self, today_prices: np.ndarray) -> np.ndarray:
+        # a copy, since it is kept as last_prices and callers may reuse their buffer
+        price_today = np.array(today_prices, dtype=float).reshape(-1)
+        # running index sum, accumulated in the same order as prices.mean(axis=0)
+        index_today = np.cumsum(price_today)[-1] / self.n_inst
+        self.index_buf[self.n_days % (LOOKBACK + 1)] = index_today
+        self.n_days += 1
+
+        positions = np.zeros(self.n_inst, dtype=int)
+        # need at least LOOKBACK+1 days of data
+        if self.n_days > max(LOOKBACK, VOL_WINDOW):
+
+            # 1) index momentum against the value LOOKBACK days ago
+            mom = index_today / self.index_buf[self.n_days % (LOOKBACK + 1)] - 1.0
+            if not abs(mom) < THRESH:
+                direction = 1 if mom > 0 else -1
+
+                # 2) realized vol over the window ending yesterday
+                m = VOL_WINDOW - 1
+                mean = self.ret_sum / m
+                var = np.maximum(self.ret_sumsq / m - mean * mean, 0.0)
+                vol = np.sqrt(var) + 1e-8
+
+                # 3) size = TARGET_DOLLAR / (price * vol)
+                raw_shares = TARGET_DOLLAR / (price_today * vol)
+                shares     = np.floor(raw_shares).astype(int)
+                dollar_position = shares * price_today
+                shares[dollar_position > 10000] = np.floor(10000 / price_today[dollar_position > 10000]).astype(int)
+                shares[shares < 1] = 1
+                positions = direction * shares
+
+        # roll today's return into the vol window (used from tomorrow on)
+        if self.last_prices is not None:
+            ret = price_today / self.last_prices - 1
+            old = self.ret_buf[:, self.ret_pos]
+            self.ret_sum += ret - old
+            self.ret_sumsq += ret * ret - old * old
+            self.ret_buf[:, self.ret_pos] = ret
+            self.ret_pos = (self.ret_pos + 1) % (VOL_WINDOW - 1)
+            if self.ret_pos == 0:
+                # resync the running sums once per lap so rounding error cannot drift
+                self.ret_sum = self.ret_buf.sum(axis=1)
+                self.ret_sumsq = (self.ret_buf * self.ret_buf).sum(axis=1)
+        self.last_prices = price_today
+        return positions
+
+    def save(self, path: str) -> None:
+        """Checkpoint the full state to an .npz, written atomically."""
+        tmp = path + ".tmp.npz"
+        last = self.last_prices if self.last_prices is not None else np.empty(0)
+        np.savez(tmp, n_inst=self.n_inst, n_days=self.n_days, last_prices=last,
+                 index_buf=self.index_buf, ret_buf=self.ret_buf, ret_pos=self.ret_pos,
+                 ret_sum=self.ret_sum, ret_sumsq=self.ret_sumsq)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MomentumStrategy":
+        """Restore a strategy from save(); it continues exactly where the saved one stopped."""
+        with np.load(path) as f:
+            strategy = cls(int(f["n_inst"]))
+            strategy.n_days = int(f["n_days"])
+            strategy.last_prices = f["last_prices"] if f["last_prices"].size else None
+            strategy.index_buf = f["index_buf"]
+            strategy.ret_buf = f["ret_buf"]
+            strategy.ret_pos = int(f["ret_pos"])
+            strategy.ret_sum = f["ret_sum"]
+            strategy.ret_sumsq = f["ret_sumsq"]
+        return strategy
+
+
+# the live state depends only on its last HISTORY_CHECK days (up to a vol-window lap of returns
+# since the running sums were last resynced, plus that lap); they are kept as a ring by day
+HISTORY_CHECK = 2 * max(LOOKBACK, VOL_WINDOW) + 1
+_live = None
+_recent = None
+
 
 def getMyPosition(price_history: np.ndarray) -> list[int]:
+    """Positions for the last day of price_history, (nInst, nt): one row per instrument."""
+    global _live, _recent
     prices = np.asarray(price_history, dtype=float)
-    if prices.shape[0] != 50:
-        prices = prices.T
     n_inst, n_days = prices.shape
 
+    # walk-forward callers pass yesterday's history plus one new day: only that day is fed in,
+    # anything else (first call, restart, different history) replays into a fresh strategy
+    seen = np.arange(max(0, n_days - 1 - HISTORY_CHECK), n_days - 1)
+    if (_live is None or _live.n_inst != n_inst or _live.n_days != n_days - 1
+            or not np.array_equal(_recent[:, seen % HISTORY_CHECK], prices[:, seen])):
+        _live = MomentumStrategy(n_inst)
+        _recent = np.empty((n_inst, HISTORY_CHECK))
+        for t in range(n_days - 1):
+            _live.update(prices[:, t])
+        _recent[:, seen % HISTORY_CHECK] = prices[:, seen]
+    _recent[:, (n_days - 1) % HISTORY_CHECK] = prices[:, -1]
+    return _live.update(prices[:, -1]).tolist()
+
+
+def getPositionsBatch(price_history: np.ndarray) -> np.ndarray:
+    """Positions for every day in one pass; column t equals getMyPosition(prices[:, :t+1]).
+
+    price_history is (nInst, nt), any number of instruments. Extra leading axes, e.g.
+    (paths, nInst, nt), are treated as independent price histories.
+    """
+    prices = np.asarray(price_history, dtype=float)
+    n_days = prices.shape[-1]
+    positions = np.zeros(prices.shape, dtype=int)
 
     # need at least LOOKBACK+1 days of data
-    if n_days <= max(LOOKBACK, VOL_WINDOW):
-        return [0] * n_inst
-
-
-    # 1) compute index momentum
-    index = prices.mean(axis=0)
-    mom = index[-1] / index[-LOOKBACK-1] - 1.0
-    if abs(mom) < THRESH:
-        return [0] * n_inst
-
-
-    direction = 1 if mom > 0 else -1
-    price_today = prices[:, -1]
-
-
-    # 2) compute each instrument's realized vol over VOL_WINDOW days
-    window = prices[:, -VOL_WINDOW-1 : -1]  # shape (50, VOL_WINDOW)
-    rets   = window[:, 1:] / window[:, :-1] - 1
-    vol     = np.std(rets, axis=1, ddof=0) + 1e-8
-
-
-    # 3) size = TARGET_DOLLAR / (price * vol)
-    raw_shares = TARGET_DOLLAR / (price_today * vol)
-    shares     = np.floor(raw_shares).astype(int)
-    dollar_position = shares * price_today
-    shares[dollar_position > 10000] = np.floor(10000 / price_today[dollar_position > 10000]).astype(int)
-    # enforce at least 1 share for non-zero positions
-    shares[shares < 1] = 1
-
-
-    # 4) apply direction
-    positions = (direction * shares).tolist()
-    return positions
\ No newline at end of file
+    first_day = max(LOOKBACK, VOL_WINDOW)
+    if n_days <= first_day:
+        return positions
+    index = prices.mean(axis=-2)
+
+    # days are processed in blocks so the temporaries stay bounded for large universes, and
+    # the running vol sums are short enough that rounding cannot build up
+    block = max(1, min(VOL_RESYNC, BATCH_BLOCK // prices[..., 0].size))
+    for start in range(first_day, n_days, block):
+        stop = min(start + block, n_days)
+        days = slice(start, stop)
+
+        # 1) index momentum for every day
+        mom = index[..., days] / index[..., start - LOOKBACK : stop - LOOKBACK] - 1.0
+        active = ~(np.abs(mom) < THRESH)[..., None, :]
+        direction = np.where(mom > 0, 1, -1)[..., None, :]
+        price_today = prices[..., days]
+
+        # 2) rolling realized vol: same VOL_WINDOW-1 returns getMyPosition sees each day, from
+        #    running sums of returns and squared returns that restart with every block
+        m = VOL_WINDOW - 1
+        window_prices = prices[..., start - VOL_WINDOW : stop - 1]
+        rets = window_prices[..., 1:] / window_prices[..., :-1] - 1
+        zero = np.zeros(rets.shape[:-1] + (1,))
+        ret_sum = np.concatenate([zero, np.cumsum(rets, axis=-1)], axis=-1)
+        ret_sumsq = np.concatenate([zero, np.cumsum(rets * rets, axis=-1)], axis=-1)
+        mean = (ret_sum[..., m:] - ret_sum[..., :-m]) / m
+        var = np.maximum((ret_sumsq[..., m:] - ret_sumsq[..., :-m]) / m - mean * mean, 0.0)
+        vol = np.sqrt(var) + 1e-8
+
+        # 3) size = TARGET_DOLLAR / (price * vol)
+        raw_shares = TARGET_DOLLAR / (price_today * vol)
+        shares     = np.floor(raw_shares).astype(int)
+        dollar_position = shares * price_today
+        capped = np.floor(10000 / price_today).astype(int)
+        shares = np.where(dollar_position > 10000, capped, shares)
+        shares[shares < 1] = 1
+
+        # 4) apply direction, flat on days below the threshold
+        positions[..., days] = direction * shares * active
+    return positions
+
+
+if __name__ == "__main__":
+    # consistency check: stateful day-by-day updates vs the whole-history computation
+    import glob
+
+    for fn in sorted(glob.glob("price_files/*.txt")):
+        prices = np.loadtxt(fn).T
+        strategy = MomentumStrategy(prices.shape[0])
+        stateful = np.column_stack([strategy.update(prices[:, t]) for t in range(prices.shape[1])])
+        stateless = getPositionsBatch(prices)
+        n_bad = int((stateful != stateless).any(axis=0).sum())
+
+        # a call whose history differs from the previous call's a few days back must replay
+        t = prices.shape[1] - 1
+        getMyPosition(prices[:, :t - 1])
+        edited = prices[:, :t].copy()
+        edited[:, t - 11] *= 0.5
+        edited_ok = getMyPosition(edited) == getPositionsBatch(edited)[:, -1].tolist()
+        print(f"{fn}: {prices.shape[1]} days, {n_bad} mismatched days, "
+              f"edited history {'ok' if edited_ok else 'MISMATCH'}")
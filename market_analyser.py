@@ -1,15 +1,21 @@
+import hashlib
+import inspect
+import itertools
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import statsmodels.api as sm
+import price_data
 
 # ───────────────────────────────────────────────────────────────────────
 # 1) Load Data Robustly
 # ───────────────────────────────────────────────────────────────────────
 DATA_PATH = "price_files/2025_prices.txt"
+ARTIFACT_DIR = "artifacts"  # arrays saved for plots and strategy research to slice
 
-df = pd.read_csv(DATA_PATH, sep=r"\s+", header=None)
+df = pd.DataFrame(np.array(price_data.load_prices(DATA_PATH).T))
 df.index = pd.date_range("2023-01-01", periods=len(df), freq="B")
 df.columns = [f"Stock_{i+1}" for i in range(df.shape[1])]
 df = df.apply(pd.to_numeric, errors="coerce")
@@ -37,21 +43,114 @@ market_rolling_vol = market_returns.rolling(ROLL_WINDOW).std() * np.sqrt(252)
 # ───────────────────────────────────────────────────────────────────────
 # Helpers
 # ───────────────────────────────────────────────────────────────────────
-def mean_rolling_autocorr(series: pd.Series, max_window: int = 100, lag: int = 1) -> pd.Series:
-    """For a range of window sizes, compute the mean lag-k autocorr over the series."""
-    s = series.dropna().astype(float)
-    x = s
-    y = s.shift(lag)
-
-    out = {}
-    for w in range(lag + 2, max_window + 1):
-        cov = x.rolling(w).cov(y)
-        stdx = x.rolling(w).std()
-        stdy = y.rolling(w).std()
-        ac = cov / (stdx * stdy)
-        out[w] = ac.mean()
-
-    return pd.Series(out)
+def _corr_prefix_sums(a: np.ndarray, b: np.ndarray) -> list:
+    """Prefix sums of a, b, a^2, b^2 and ab (centred first), with a leading row of zeros."""
+    a = a - a.mean(axis=0)
+    b = b - b.mean(axis=0)
+    zero = np.zeros((1, a.shape[1]))
+    return [np.concatenate([zero, np.cumsum(v, axis=0)]) for v in (a, b, a * a, b * b, a * b)]
+
+def _window_corr(prefix: list, w: int):
+    """corr(a, b) over every length-w window (NaN where a window has no variance) and its mask."""
+    return _corr_from_sums(*(p[w:] - p[:-w] for p in prefix), w)
+
+def _corr_from_sums(sa, sb, saa, sbb, sab, w: int):
+    """Window correlations from window sums; the sum arrays are overwritten."""
+    # w^2 * var and w^2 * cov of each window, computed in place
+    saa *= w
+    saa -= sa * sa
+    sbb *= w
+    sbb -= sb * sb
+    sab *= w
+    sab -= sa * sb
+    saa *= sbb
+    valid = saa > 0
+    np.sqrt(saa, out=saa)
+    np.divide(sab, saa, out=sab, where=valid)
+    sab[~valid] = np.nan
+    return sab, valid
+
+def _mean_rolling_corr(a: np.ndarray, b: np.ndarray, windows) -> np.ndarray:
+    """Mean over all length-w windows of corr(a, b) for each w, from prefix sums; a, b are (n, k)."""
+    prefix = _corr_prefix_sums(a, b)
+    out = np.full((len(windows), a.shape[1]), np.nan)
+    for i, w in enumerate(windows):
+        if w > len(a):
+            continue
+        ac, valid = _window_corr(prefix, w)
+        if valid.all():
+            out[i] = ac.mean(axis=0)
+        else:
+            n_valid = valid.sum(axis=0)
+            total = np.where(valid, ac, 0.0).sum(axis=0)
+            out[i] = np.where(n_valid > 0, total / np.maximum(n_valid, 1), np.nan)
+    return out
+
+def mean_rolling_autocorr(series, max_window: int = 100, lag: int = 1):
+    """For a range of window sizes, compute the mean lag-k autocorr over the series.
+
+    A DataFrame gives one column per stock (rows with any NaN are dropped). Every window size
+    comes from the same prefix sums, so the sweep is O(N) per window instead of three pandas
+    rolling passes.
+    """
+    data = series.dropna().astype(float)
+    x = data.to_numpy().reshape(len(data), -1)
+    windows = list(range(lag + 2, max_window + 1))
+    out = _mean_rolling_corr(x[lag:], x[:len(x) - lag], windows)
+
+    if isinstance(series, pd.DataFrame):
+        return pd.DataFrame(out, index=windows, columns=series.columns)
+    return pd.Series(out[:, 0], index=windows)
+
+def autocorr_window_lag_matrix(returns, max_window: int = 100, max_lag: int = 20) -> np.ndarray:
+    """Mean rolling autocorr for every window size and lag: array[window, lag, stock] (NaN if unused)."""
+    data = returns.dropna().astype(float)
+    x = data.to_numpy().reshape(len(data), -1)
+    out = np.full((max_window + 1, max_lag + 1, x.shape[1]), np.nan)
+    for lag in range(1, max_lag + 1):
+        windows = list(range(lag + 2, max_window + 1))
+        out[lag + 2:, lag] = _mean_rolling_corr(x[lag:], x[:len(x) - lag], windows)
+    return out
+
+def rolling_acf_surface(returns: pd.DataFrame, window: int, max_lag: int = 20) -> np.ndarray:
+    """Rolling lag-k autocorrelation for every stock and lag: array[lag, day, stock].
+
+    Days follow returns.dropna(); entry [lag, t, i] equals rolling_autocorr_ts(returns[col_i],
+    window, lag) at day t. Lag 0 and days before the first full window are NaN.
+    """
+    x = returns.dropna().to_numpy(dtype=float)
+    x = x - x.mean(axis=0)
+    T, N = x.shape
+    zero = np.zeros((1, N))
+    # window sums of x and x^2 are shared by every lag; only the cross products change
+    p1 = np.concatenate([zero, np.cumsum(x, axis=0)])
+    p2 = np.concatenate([zero, np.cumsum(x * x, axis=0)])
+
+    out = np.full((max_lag + 1, T, N), np.nan)
+    w = window
+    for lag in range(1, max_lag + 1):
+        if lag + w > T:
+            break
+        n = T - lag - w + 1  # number of windows
+        pab = np.concatenate([zero, np.cumsum(x[lag:] * x[:T - lag], axis=0)])
+        sa = p1[lag + w:] - p1[lag:lag + n]
+        sb = p1[w:w + n] - p1[:n]
+        saa = p2[lag + w:] - p2[lag:lag + n]
+        sbb = p2[w:w + n] - p2[:n]
+        ac, _ = _corr_from_sums(sa, sb, saa, sbb, pab[w:] - pab[:-w], w)
+        out[lag, lag + w - 1:] = ac
+    return out
+
+def save_acf_surface(path: str, surface: np.ndarray, window: int, columns) -> None:
+    """Store a rolling ACF surface as compressed float32 with its window and stock names."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, acf=surface.astype(np.float32), window=window,
+                        columns=np.asarray(columns, dtype=str))
+
+def load_acf_surface(path: str):
+    """(surface[lag, day, stock], window, stock names) from save_acf_surface."""
+    with np.load(path) as z:
+        return z["acf"], int(z["window"]), list(z["columns"])
 
 def rolling_autocorr_ts(series: pd.Series, window: int, lag: int = 1) -> pd.Series:
     """Time-series of rolling lag-k autocorrelation (used for regime detection)."""
@@ -70,6 +169,9 @@ def fwd_cum_return(r: pd.Series, k: int) -> pd.Series:
     return rr.shift(-1).rolling(k).apply(np.prod, raw=True) - 1.0
 
 def fit_ar1(series: pd.Series):
+    """Per-series statsmodels OLS fit; kept only to verify fit_ar1_batch."""
+    import statsmodels.api as sm
+
     s = series.dropna().astype(float)
     if len(s) < 50:
         return np.nan, np.nan
@@ -83,156 +185,371 @@ def fit_ar1(series: pd.Series):
     except Exception:
         return np.nan, np.nan
 
+def fit_ar1_batch(df_returns: pd.DataFrame, min_obs: int = 50) -> pd.DataFrame:
+    """AR(1) fit r_t = alpha + phi * r_{t-1} for every column at once, from closed-form moments.
+
+    Only pairs where both days are finite are used. Returns alpha, phi, se_phi, r2 and n per stock.
+    """
+    r = df_returns.to_numpy(dtype=float)
+    x, y = r[:-1], r[1:]
+    mask = np.isfinite(x) & np.isfinite(y)
+    n = mask.sum(axis=0)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx = x.sum(axis=0) / n
+        my = y.sum(axis=0) / n
+        dx = np.where(mask, x - mx, 0.0)
+        dy = np.where(mask, y - my, 0.0)
+        sxx = (dx * dx).sum(axis=0)
+        syy = (dy * dy).sum(axis=0)
+        sxy = (dx * dy).sum(axis=0)
+
+        phi = sxy / sxx
+        alpha = my - phi * mx
+        ssr = syy - phi * sxy
+        se_phi = np.sqrt(ssr / (n - 2) / sxx)
+        r2 = 1.0 - ssr / syy
+
+    out = pd.DataFrame({"alpha": alpha, "phi": phi, "se_phi": se_phi, "r2": r2, "n": n},
+                       index=df_returns.columns)
+    out.loc[n < min_obs, ["alpha", "phi", "se_phi", "r2"]] = np.nan
+    return out
+
+def rolling_ar1_phi(df_returns: pd.DataFrame, window: int) -> pd.DataFrame:
+    """AR(1) phi over a trailing window of `window` return pairs: a (day x stock) surface."""
+    r = df_returns.to_numpy(dtype=float)
+    x, y = r[:-1], r[1:]
+    mask = np.isfinite(x) & np.isfinite(y)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+
+    def rolling_sum(v):
+        c = np.concatenate([np.zeros((1, v.shape[1])), np.cumsum(v, axis=0)])
+        return c[window:] - c[:-window]
+
+    n = rolling_sum(mask.astype(float))
+    sx, sy = rolling_sum(x), rolling_sum(y)
+    sxx, sxy = rolling_sum(x * x), rolling_sum(x * y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        phi = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    phi[n < max(3, window // 2)] = np.nan
+
+    out = np.full(r.shape, np.nan)
+    out[window:] = phi
+    return pd.DataFrame(out, index=df_returns.index, columns=df_returns.columns)
+
+def plot_acf(series: pd.Series, lags: int, ax, alpha: float = 0.05):
+    """Stem plot of the sample ACF with a Bartlett confidence band (statsmodels plot_acf look)."""
+    from statistics import NormalDist
+
+    x = series.dropna().to_numpy(dtype=float)
+    x = x - x.mean()
+    denom = (x * x).sum()
+    acf = np.array([1.0] + [(x[k:] * x[:-k]).sum() / denom for k in range(1, lags + 1)])
+
+    varacf = np.ones(lags + 1) / len(x)
+    varacf[0] = 0
+    varacf[2:] *= 1 + 2 * np.cumsum(acf[1:-1] ** 2)
+    band = NormalDist().inv_cdf(1 - alpha / 2) * np.sqrt(varacf)
+
+    k = np.arange(lags + 1)
+    ax.vlines(k, 0, acf)
+    ax.axhline(0, linewidth=1)
+    ax.plot(k, acf, "o", markersize=5)
+    band_x = k[1:].astype(float)
+    band_x[0] -= 0.5
+    band_x[-1] += 0.5
+    ax.fill_between(band_x, -band[1:], band[1:], alpha=0.25, linewidth=0)
+    ax.xaxis.set_major_locator(plt.MaxNLocator(integer=True))
+    ax.margins(0.05)
+    ax.set_ylim(-1, 1)
+
+def lead_lag_cube(returns: pd.DataFrame, lags, method: str = "direct") -> np.ndarray:
+    """Cross-correlation cube[k, i, j] = corr(series_i(t), series_j(t + lags[k])) for every pair.
+
+    Positive lag means column i leads column j. "direct" does one matrix multiply per lag with the
+    overlap re-centred (same numbers as pandas .corr on the shifted series); "fft" gets every lag
+    from one FFT of the full-sample standardised returns, which is cheaper for long lag ranges.
+    """
+    X = returns.dropna().to_numpy(dtype=float)
+    T, N = X.shape
+    lags = np.asarray(lags)
+
+    if method == "fft":
+        Z = (X - X.mean(axis=0)) / X.std(axis=0)
+        nfft = 1 << int(np.ceil(np.log2(2 * T)))
+        F = np.fft.rfft(Z, n=nfft, axis=0)
+        xc = np.fft.irfft(np.conj(F)[:, :, None] * F[:, None, :], n=nfft, axis=0)
+        return xc[lags % nfft] / (T - np.abs(lags))[:, None, None]
+
+    cube = np.empty((len(lags), N, N))
+    for k, lag in enumerate(lags):
+        A = X[:T - lag] if lag >= 0 else X[-lag:]
+        B = X[lag:] if lag >= 0 else X[:T + lag]
+        A = A - A.mean(axis=0)
+        B = B - B.mean(axis=0)
+        cube[k] = (A.T @ B) / np.outer(np.linalg.norm(A, axis=0), np.linalg.norm(B, axis=0))
+    return cube
+
+def rolling_lead_lag(returns: pd.DataFrame, lag: int, window: int) -> np.ndarray:
+    """Rolling version of one cube slice: out[t, i, j] = corr(series_i, series_j shifted by lag)
+    over the `window` pairs ending at follower day t (NaN until the first full window)."""
+    X = returns.dropna().to_numpy(dtype=float)
+    X = X - X.mean(axis=0)
+    T, N = X.shape
+    A, B = (X[:T - lag], X[lag:]) if lag >= 0 else (X[-lag:], X[:T + lag])
+
+    def rolling_sum(v):
+        c = np.cumsum(v, axis=0)
+        c[window:] -= c[:-window].copy()
+        return c[window - 1:]
+
+    sa, sb = rolling_sum(A), rolling_sum(B)
+    saa, sbb = rolling_sum(A * A), rolling_sum(B * B)
+    sab = rolling_sum(A[:, :, None] * B[:, None, :])
+    cov = window * sab - sa[:, :, None] * sb[:, None, :]
+    var = (window * saa - sa * sa)[:, :, None] * (window * sbb - sb * sb)[:, None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.sqrt(var)
+
+    out = np.full((T, N, N), np.nan)
+    out[T - len(corr):] = corr
+    return out
+
+def lead_lag_significance(cube: np.ndarray, lags, n_obs: int, alpha: float = 0.05,
+                          bonferroni: bool = True) -> np.ndarray:
+    """Mask of cube entries beyond the large-sample null band z / sqrt(overlap)."""
+    from statistics import NormalDist
+
+    n_tests = cube.size if bonferroni else 1
+    z = NormalDist().inv_cdf(1 - alpha / (2 * n_tests))
+    overlap = n_obs - np.abs(np.asarray(lags))
+    return np.abs(cube) > (z / np.sqrt(overlap))[:, None, None]
+
+def top_lead_lag_pairs(cube: np.ndarray, lags, names, mask: np.ndarray, k: int = 20) -> pd.DataFrame:
+    """Strongest significant leader -> follower pairs; cube[-l, i, j] == cube[l, j, i], so only l > 0."""
+    lags = np.asarray(lags)
+    sel = mask & (lags > 0)[:, None, None]
+    kk, ii, jj = np.nonzero(sel)
+    keep = ii != jj
+    kk, ii, jj = kk[keep], ii[keep], jj[keep]
+    out = pd.DataFrame({
+        "Leader": np.asarray(names)[ii],
+        "Follower": np.asarray(names)[jj],
+        "Lag": lags[kk],
+        "Correlation": cube[kk, ii, jj],
+    })
+    return out.reindex(out["Correlation"].abs().sort_values(ascending=False).index).head(k)
+
 def per_stock_autocorr(df_returns: pd.DataFrame, lag: int) -> pd.Series:
     """Per-stock autocorrelation of returns at a given lag."""
-    acf = df_returns.apply(lambda s: s.dropna().autocorr(lag=lag))
+    x = df_returns.dropna().to_numpy(dtype=float)
+    a = x[lag:] - x[lag:].mean(axis=0)
+    b = x[:len(x) - lag] - x[:len(x) - lag].mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        acf = (a * b).sum(axis=0) / np.sqrt((a * a).sum(axis=0) * (b * b).sum(axis=0))
+    acf = pd.Series(acf, index=df_returns.columns)
     acf = acf.replace([np.inf, -np.inf], np.nan).dropna()
     return acf
 
 # ───────────────────────────────────────────────────────────────────────
-# 3) Generate Graphs
+# Shared analysis inputs for the figures
+# ───────────────────────────────────────────────────────────────────────
+acf_window = 100
+acf_sig = 2.0 / np.sqrt(acf_window)  # rough significance band
+
+# Regime thresholds for volatility – based on 100D market_rolling_vol
+vol_low, vol_high = np.nanpercentile(market_rolling_vol.dropna(), [20, 80])
+
+# Every stock and lag 1-20; the 20A/20B plots are slices of this surface
+stock_acf = rolling_acf_surface(log_returns, window=acf_window, max_lag=20)
+
+# Full (lag x leader x follower) cube over every stock plus the market; positive lag = row leads
+max_lag = 5
+ll_lags = np.arange(-max_lag, max_lag + 1)
+ll_series = log_returns.assign(Market=log_returns.mean(axis=1)).dropna()
+lead_lag = lead_lag_cube(ll_series, ll_lags)
+
+def lead_lag_screen(k: int = 20):
+    """(significance mask over the cube, top-k significant directed pairs) across every stock."""
+    sig = lead_lag_significance(lead_lag, ll_lags, len(ll_series))
+    return sig, top_lead_lag_pairs(lead_lag, ll_lags, ll_series.columns, sig, k)
+
+# Market(t) vs Stock_i(t + lag) view for the heatmap: Rows = Lags, Columns = Stocks
+m = ll_series.columns.get_loc("Market")
+lead_lag_pivot = pd.DataFrame(lead_lag[:, m, :m], index=pd.Index(ll_lags, name="Lag"),
+                              columns=log_returns.columns)
+
+# ───────────────────────────────────────────────────────────────────────
+# 3) Figure Registry
 # ───────────────────────────────────────────────────────────────────────
-figures = {}
+FIGURES = {}  # name -> (plot function, params); each function returns a finished figure
+
+def figure(name: str, **grid):
+    """Register a plot function; list-valued params register one figure per combination."""
+    def register(fn):
+        keys = list(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            params = dict(zip(keys, values))
+            FIGURES[name.format(**params)] = (fn, params)
+        return fn
+    return register
 
 # 1) Correlation Matrix
-fig, ax = plt.subplots(figsize=(10, 8))
-corr_matrix = log_returns.corr()
-im = ax.imshow(corr_matrix, cmap="coolwarm", interpolation="none", aspect="auto")
-fig.colorbar(im, ax=ax, label="Correlation")
-ax.set_title(f"Correlation Matrix ({df.shape[1]} Stocks)")
-ax.set_xlabel("Stock index")
-ax.set_ylabel("Stock index")
-plt.tight_layout()
-figures["01_correlation_matrix"] = fig
+@figure("01_correlation_matrix")
+def plot_correlation_matrix():
+    fig, ax = plt.subplots(figsize=(10, 8))
+    corr_matrix = log_returns.corr()
+    im = ax.imshow(corr_matrix, cmap="coolwarm", interpolation="none", aspect="auto")
+    fig.colorbar(im, ax=ax, label="Correlation")
+    ax.set_title(f"Correlation Matrix ({df.shape[1]} Stocks)")
+    ax.set_xlabel("Stock index")
+    ax.set_ylabel("Stock index")
+    plt.tight_layout()
+    return fig
 
 # 2) Histogram of Log Returns
-fig, ax = plt.subplots(figsize=(10, 6))
-ax.hist(finite_vals(log_returns.to_numpy()), bins=100, edgecolor="black", alpha=0.7)
-ax.set_title("Distribution of Log Returns")
-ax.set_xlabel("Log return")
-ax.set_ylabel("Frequency")
-plt.tight_layout()
-figures["02_log_return_hist"] = fig
+@figure("02_log_return_hist")
+def plot_log_return_hist():
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.hist(finite_vals(log_returns.to_numpy()), bins=100, edgecolor="black", alpha=0.7)
+    ax.set_title("Distribution of Log Returns")
+    ax.set_xlabel("Log return")
+    ax.set_ylabel("Frequency")
+    plt.tight_layout()
+    return fig
 
 # 3) Histogram of Rolling Volatility (per-stock) – 100D
-fig, ax = plt.subplots(figsize=(10, 6))
-ax.hist(finite_vals(rolling_vol.to_numpy()), bins=100, edgecolor="black", alpha=0.7)
-ax.set_title("Distribution of Rolling Volatility (100-Day)")
-ax.set_xlabel("100D annualised volatility")
-ax.set_ylabel("Frequency")
-plt.tight_layout()
-figures["03_rolling_vol_hist"] = fig
+@figure("03_rolling_vol_hist")
+def plot_rolling_vol_hist():
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.hist(finite_vals(rolling_vol.to_numpy()), bins=100, edgecolor="black", alpha=0.7)
+    ax.set_title("Distribution of Rolling Volatility (100-Day)")
+    ax.set_xlabel("100D annualised volatility")
+    ax.set_ylabel("Frequency")
+    plt.tight_layout()
+    return fig
 
 # 4) Cumulative Returns
-fig, ax = plt.subplots(figsize=(12, 6))
-rebased_df = df / df.iloc[0] * 100
-x_days = np.arange(len(rebased_df))
-ax.plot(x_days, rebased_df.values, alpha=0.1)
-ax.plot(x_days, rebased_df.mean(axis=1).values, linewidth=2, label="Index")
-ax.legend()
-ax.set_title("Cumulative Returns (Rebased)")
-ax.set_xlabel("Day")
-ax.set_ylabel("Rebased price (index = 100)")
-plt.tight_layout()
-figures["04_cumulative_returns"] = fig
+@figure("04_cumulative_returns")
+def plot_cumulative_returns():
+    fig, ax = plt.subplots(figsize=(12, 6))
+    rebased_df = df / df.iloc[0] * 100
+    x_days = np.arange(len(rebased_df))
+    ax.plot(x_days, rebased_df.values, alpha=0.1)
+    ax.plot(x_days, rebased_df.mean(axis=1).values, linewidth=2, label="Index")
+    ax.legend()
+    ax.set_title("Cumulative Returns (Rebased)")
+    ax.set_xlabel("Day")
+    ax.set_ylabel("Rebased price (index = 100)")
+    plt.tight_layout()
+    return fig
 
 # 5) Market ACF
-fig, ax = plt.subplots(figsize=(10, 6))
-if not market_returns.empty:
-    sm.graphics.tsa.plot_acf(market_returns, lags=20, ax=ax)
-ax.set_title("ACF of Market Returns")
-ax.set_xlabel("Lag")
-ax.set_ylabel("Autocorrelation")
-plt.tight_layout()
-figures["05_market_acf"] = fig
+@figure("05_market_acf")
+def plot_market_acf():
+    fig, ax = plt.subplots(figsize=(10, 6))
+    if not market_returns.empty:
+        plot_acf(market_returns, lags=20, ax=ax)
+    ax.set_title("ACF of Market Returns")
+    ax.set_xlabel("Lag")
+    ax.set_ylabel("Autocorrelation")
+    plt.tight_layout()
+    return fig
 
 # 6) Trend Strength (Market vs MA)
-fig, ax = plt.subplots(figsize=(12, 6))
-ma_window = 100
-market_ma = market_rebased.rolling(ma_window).mean()
-x_days = np.arange(len(market_rebased))
-ax.plot(x_days, market_rebased.values, label="Market (rebased)")
-ax.plot(x_days, market_ma.values, label=f"MA-{ma_window}")
-ax.legend()
-ax.set_title("Trend Strength (Market vs MA)")
-ax.set_xlabel("Day")
-ax.set_ylabel("Rebased price (index = 100)")
-plt.tight_layout()
-figures["06_trend_strength_ma"] = fig
+@figure("06_trend_strength_ma", ma_window=[100])
+def plot_trend_strength(ma_window):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    market_ma = market_rebased.rolling(ma_window).mean()
+    x_days = np.arange(len(market_rebased))
+    ax.plot(x_days, market_rebased.values, label="Market (rebased)")
+    ax.plot(x_days, market_ma.values, label=f"MA-{ma_window}")
+    ax.legend()
+    ax.set_title("Trend Strength (Market vs MA)")
+    ax.set_xlabel("Day")
+    ax.set_ylabel("Rebased price (index = 100)")
+    plt.tight_layout()
+    return fig
 
 # 7) Z-score of Market Returns
-fig, ax = plt.subplots(figsize=(12, 6))
-z_window = 60
-mr = log_returns.mean(axis=1)
-z = (mr - mr.rolling(z_window).mean()) / mr.rolling(z_window).std()
-x_days = np.arange(len(z))
-ax.plot(x_days, z.values)
-ax.axhline(0, color="black", linewidth=1)
-ax.axhline(2, linestyle="--", color="grey")
-ax.axhline(-2, linestyle="--", color="grey")
-ax.set_title("Z-score of Market Returns")
-ax.set_xlabel("Day")
-ax.set_ylabel("Z-score")
-plt.tight_layout()
-figures["07_market_zscore"] = fig
+@figure("07_market_zscore", z_window=[60])
+def plot_market_zscore(z_window):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    mr = log_returns.mean(axis=1)
+    z = (mr - mr.rolling(z_window).mean()) / mr.rolling(z_window).std()
+    x_days = np.arange(len(z))
+    ax.plot(x_days, z.values)
+    ax.axhline(0, color="black", linewidth=1)
+    ax.axhline(2, linestyle="--", color="grey")
+    ax.axhline(-2, linestyle="--", color="grey")
+    ax.set_title("Z-score of Market Returns")
+    ax.set_xlabel("Day")
+    ax.set_ylabel("Z-score")
+    plt.tight_layout()
+    return fig
 
 # 8) Cross-sectional Avg Vol by Day – from 100D vol
-fig, ax = plt.subplots(figsize=(10, 6))
-vol_by_day = rolling_vol.mean(axis=1)
-ax.hist(vol_by_day.dropna(), bins=60, edgecolor="black", alpha=0.7)
-ax.set_title("Cross-Sectional Avg Rolling Vol (by day)")
-ax.set_xlabel("100D annualised volatility (cross-sectional mean)")
-ax.set_ylabel("Frequency")
-plt.tight_layout()
-figures["09_cross_sectional_vol_distribution"] = fig
+@figure("09_cross_sectional_vol_distribution")
+def plot_cross_sectional_vol():
+    fig, ax = plt.subplots(figsize=(10, 6))
+    vol_by_day = rolling_vol.mean(axis=1)
+    ax.hist(vol_by_day.dropna(), bins=60, edgecolor="black", alpha=0.7)
+    ax.set_title("Cross-Sectional Avg Rolling Vol (by day)")
+    ax.set_xlabel("100D annualised volatility (cross-sectional mean)")
+    ax.set_ylabel("Frequency")
+    plt.tight_layout()
+    return fig
 
 # 9) Avg Vol by Stock – from 100D vol
-fig, ax = plt.subplots(figsize=(10, 6))
-vol_by_stock = rolling_vol.mean(axis=0)
-ax.hist(vol_by_stock.dropna(), bins=30, edgecolor="black", alpha=0.7)
-ax.set_title("Avg Rolling Vol (by stock)")
-ax.set_xlabel("Average 100D annualised volatility")
-ax.set_ylabel("Frequency")
-plt.tight_layout()
-figures["10_avg_vol_distribution"] = fig
+@figure("10_avg_vol_distribution")
+def plot_avg_vol_by_stock():
+    fig, ax = plt.subplots(figsize=(10, 6))
+    vol_by_stock = rolling_vol.mean(axis=0)
+    ax.hist(vol_by_stock.dropna(), bins=30, edgecolor="black", alpha=0.7)
+    ax.set_title("Avg Rolling Vol (by stock)")
+    ax.set_xlabel("Average 100D annualised volatility")
+    ax.set_ylabel("Frequency")
+    plt.tight_layout()
+    return fig
 
 # 10) AR(1) Scatter (market continuation vs reversal)
-fig, ax = plt.subplots(figsize=(7, 6))
-x = market_returns.iloc[:-1].values
-y = market_returns.iloc[1:].values
-ax.scatter(x, y, alpha=0.3)
-ax.set_xlabel("Return_t")
-ax.set_ylabel("Return_{t+1}")
-ax.set_title("Next-day vs Same-day Returns (Market)")
-plt.tight_layout()
-figures["11_market_nextday_scatter"] = fig
+@figure("11_market_nextday_scatter")
+def plot_market_nextday_scatter():
+    fig, ax = plt.subplots(figsize=(7, 6))
+    x = market_returns.iloc[:-1].values
+    y = market_returns.iloc[1:].values
+    ax.scatter(x, y, alpha=0.3)
+    ax.set_xlabel("Return_t")
+    ax.set_ylabel("Return_{t+1}")
+    ax.set_title("Next-day vs Same-day Returns (Market)")
+    plt.tight_layout()
+    return fig
 
 # ───────────────────────────────────────────────────────────────────────
 # Volatility & Regime Plots
 # ───────────────────────────────────────────────────────────────────────
 
-# Regime thresholds for volatility – based on 100D market_rolling_vol
-vol_low, vol_high = np.nanpercentile(market_rolling_vol.dropna(), [20, 80])
-
 # 11) Market Rolling Volatility with Regime Bands – 100D
-fig, ax = plt.subplots(figsize=(12, 6))
-t_idx = np.arange(len(market_rolling_vol))
-ax.plot(t_idx, market_rolling_vol.values, label="100D rolling vol")
-ax.axhline(vol_low, linestyle="--", color="green", label="Low-vol threshold (20th pct)")
-ax.axhline(vol_high, linestyle="--", color="red", label="High-vol threshold (80th pct)")
-ax.set_title("Market Rolling Volatility (100D) & Regime Thresholds")
-ax.set_xlabel("Day")
-ax.set_ylabel("Annualised volatility")
-ax.legend()
-plt.tight_layout()
-figures["15_market_rolling_vol_regimes"] = fig
+@figure("15_market_rolling_vol_regimes")
+def plot_market_vol_regimes():
+    fig, ax = plt.subplots(figsize=(12, 6))
+    t_idx = np.arange(len(market_rolling_vol))
+    ax.plot(t_idx, market_rolling_vol.values, label="100D rolling vol")
+    ax.axhline(vol_low, linestyle="--", color="green", label="Low-vol threshold (20th pct)")
+    ax.axhline(vol_high, linestyle="--", color="red", label="High-vol threshold (80th pct)")
+    ax.set_title("Market Rolling Volatility (100D) & Regime Thresholds")
+    ax.set_xlabel("Day")
+    ax.set_ylabel("Annualised volatility")
+    ax.legend()
+    plt.tight_layout()
+    return fig
 
 # 12) Rolling Autocorrelation for separate lags (1, 2, 5, 10) — MARKET
-acf_window = 100
-lags = [1, 2, 5, 10]
-acf_sig = 2.0 / np.sqrt(acf_window)  # rough significance band
-
-for lag in lags:
+@figure("16_market_rolling_acf_lag{lag}", lag=[1, 2, 5, 10])
+def plot_market_rolling_acf(lag):
     roll_acf_k = rolling_autocorr_ts(market_returns, window=acf_window, lag=lag)
 
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -248,21 +565,20 @@ for lag in lags:
     ax.set_ylabel("Autocorrelation")
     ax.legend()
     plt.tight_layout()
-    figures[f"16_market_rolling_acf_lag{lag}"] = fig
+    return fig
 
 # 13) Distribution of AR(1) phi (single-name behaviour)
-phis = []
-for col in log_returns.columns:
-    phi, _ = fit_ar1(log_returns[col])
-    phis.append(phi)
-
-fig, ax = plt.subplots(figsize=(9, 5))
-ax.hist([p for p in phis if np.isfinite(p)], bins=25, edgecolor="black")
-ax.set_title("Distribution of AR(1) phi")
-ax.set_xlabel("AR(1) phi")
-ax.set_ylabel("Frequency")
-plt.tight_layout()
-figures["13_ar1_phi_distribution"] = fig
+@figure("13_ar1_phi_distribution")
+def plot_ar1_phi_distribution():
+    phis = fit_ar1_batch(log_returns)["phi"].to_numpy()
+
+    fig, ax = plt.subplots(figsize=(9, 5))
+    ax.hist([p for p in phis if np.isfinite(p)], bins=25, edgecolor="black")
+    ax.set_title("Distribution of AR(1) phi")
+    ax.set_xlabel("AR(1) phi")
+    ax.set_ylabel("Frequency")
+    plt.tight_layout()
+    return fig
 
 # ───────────────────────────────────────────────────────────────────────
 # ADDITIONAL PLOTS (KEEPING 19 + REWORKING 20, REMOVING 17 + 18)
@@ -270,116 +586,161 @@ figures["13_ar1_phi_distribution"] = fig
 
 # C) Rolling 100D volatility over time for top-2 most volatile and top-2 least volatile
 #    (based on avg 100D rolling vol)
-vol_by_stock = rolling_vol.mean(axis=0).replace([np.inf, -np.inf], np.nan).dropna()
-most_vol_stocks = vol_by_stock.nlargest(2).index.tolist()
-least_vol_stocks = vol_by_stock.nsmallest(2).index.tolist()
+@figure("19_rolling_volatility_extremes_timeseries")
+def plot_rolling_vol_extremes():
+    vol_by_stock = rolling_vol.mean(axis=0).replace([np.inf, -np.inf], np.nan).dropna()
+    most_vol_stocks = vol_by_stock.nlargest(2).index.tolist()
+    least_vol_stocks = vol_by_stock.nsmallest(2).index.tolist()
 
-sel_vol = most_vol_stocks + least_vol_stocks
-if len(sel_vol) > 0:
     fig, ax = plt.subplots(figsize=(12, 6))
     x_days = np.arange(len(rolling_vol))
-    for col in sel_vol:
+    for col in most_vol_stocks + least_vol_stocks:
         ax.plot(x_days, rolling_vol[col].values, label=col)
     ax.set_title("Rolling 100D Volatility Over Time — Top 2 Most vs Top 2 Least Volatile Stocks")
     ax.set_xlabel("Day")
     ax.set_ylabel("Annualised volatility (100D rolling)")
     ax.legend()
     plt.tight_layout()
-    figures["19_rolling_volatility_extremes_timeseries"] = fig
+    return fig
 
 # D) Rolling 100D ACF over time for lag 1,2,5,10
 #    Split into TWO plots per lag: (Top-2 Highest ACF) and (Bottom-2 Lowest ACF)
-for lag in [1, 2, 5, 10]:
+@figure("20A_stock_rolling_acf_lag{lag}_top2", lag=[1, 2, 5, 10], side=["top"])
+@figure("20B_stock_rolling_acf_lag{lag}_bottom2", lag=[1, 2, 5, 10], side=["bottom"])
+def plot_stock_rolling_acf(lag, side):
     acf = per_stock_autocorr(log_returns, lag=lag)
-    if acf.empty:
-        continue
+    names = acf.nlargest(2).index.tolist() if side == "top" else acf.nsmallest(2).index.tolist()
+    label = "Top 2 Highest ACF Stocks" if side == "top" else "Bottom 2 Lowest ACF Stocks"
 
-    top2_names = acf.nlargest(2).index.tolist()
-    bot2_names = acf.nsmallest(2).index.tolist()
-
-    # --- Top 2 plot
     fig, ax = plt.subplots(figsize=(12, 6))
-    for col in top2_names:
-        roll_acf = rolling_autocorr_ts(log_returns[col], window=acf_window, lag=lag)
-        ax.plot(np.arange(len(roll_acf)), roll_acf.values, label=col)
+    for col in names:
+        roll_acf = stock_acf[lag, :, log_returns.columns.get_loc(col)]
+        ax.plot(np.arange(len(roll_acf)), roll_acf, label=col)
     ax.axhline(0.0, color="black", linewidth=1)
     ax.axhline(acf_sig, linestyle="--", color="red", label="Momentum threshold")
     ax.axhline(-acf_sig, linestyle="--", color="green", label="Mean-reversion threshold")
-    ax.set_title(f"Rolling {acf_window}D Autocorrelation — Lag {lag}\nTop 2 Highest ACF Stocks")
+    ax.set_title(f"Rolling {acf_window}D Autocorrelation — Lag {lag}\n{label}")
     ax.set_xlabel("Day")
     ax.set_ylabel("Rolling autocorrelation (log returns)")
     ax.legend()
     plt.tight_layout()
-    figures[f"20A_stock_rolling_acf_lag{lag}_top2"] = fig
-
-    # --- Bottom 2 plot
-    fig, ax = plt.subplots(figsize=(12, 6))
-    for col in bot2_names:
-        roll_acf = rolling_autocorr_ts(log_returns[col], window=acf_window, lag=lag)
-        ax.plot(np.arange(len(roll_acf)), roll_acf.values, label=col)
-    ax.axhline(0.0, color="black", linewidth=1)
-    ax.axhline(acf_sig, linestyle="--", color="red", label="Momentum threshold")
-    ax.axhline(-acf_sig, linestyle="--", color="green", label="Mean-reversion threshold")
-    ax.set_title(f"Rolling {acf_window}D Autocorrelation — Lag {lag}\nBottom 2 Lowest ACF Stocks")
-    ax.set_xlabel("Day")
-    ax.set_ylabel("Rolling autocorrelation (log returns)")
-    ax.legend()
-    plt.tight_layout()
-    figures[f"20B_stock_rolling_acf_lag{lag}_bottom2"] = fig
-
+    return fig
 
 # ───────────────────────────────────────────────────────────────────────
 # Lead-Lag Hypothesis Testing
 # ───────────────────────────────────────────────────────────────────────
-max_lag = 5
-lead_lag_results = []
-
-# Calculate correlation between Market(t) and Stock_i(t + lag)
-for col in log_returns.columns:
-    stock_series = log_returns[col]
-    for lag in range(-max_lag, max_lag + 1):
-        # positive lag means market leads stock
-        corr = market_returns.corr(stock_series.shift(-lag))
-        lead_lag_results.append({'Stock': col, 'Lag': lag, 'Correlation': corr})
-
-lead_lag_df = pd.DataFrame(lead_lag_results)
-
-# Pivot for heatmap: Rows = Lags, Columns = Stocks
-lead_lag_pivot = lead_lag_df.pivot(index='Lag', columns='Stock', values='Correlation')
-
-fig, ax = plt.subplots(figsize=(14, 6))
-im = ax.imshow(lead_lag_pivot, cmap="RdYlGn", aspect='auto', origin='lower',
-               extent=[0, len(df.columns), -max_lag, max_lag])
-
-fig.colorbar(im, label="Correlation with Market")
-ax.set_yticks(range(-max_lag, max_lag + 1))
-ax.axhline(0, color='black', linewidth=2, linestyle='-') # Contemporaneous line
-ax.set_title("Lead-Lag Heatmap: Market(t) vs Stock(t + Lag)\nPositive Lag = Market Leads Stock")
-ax.set_ylabel("Lag (Days)")
-ax.set_xlabel("Stock Index")
-
-# Add a summary line plot of the average cross-correlation across all stocks
-fig2, ax2 = plt.subplots(figsize=(10, 6))
-avg_lead_lag = lead_lag_pivot.mean(axis=1)
-ax2.plot(avg_lead_lag.index, avg_lead_lag.values, marker='o', linewidth=2)
-ax2.axhline(0, color='black', alpha=0.3)
-ax2.axvline(0, color='red', linestyle='--', label='Contemporaneous')
-ax2.set_title("Average Cross-Correlation: Market vs. Universe")
-ax2.set_xlabel("Lag (Days: Positive = Market Leads)")
-ax2.set_ylabel("Average Correlation")
-ax2.legend()
-ax2.grid(True, alpha=0.3)
-
-figures["21_lead_lag_heatmap"] = fig
-figures["22_avg_lead_lag_profile"] = fig2
+@figure("21_lead_lag_heatmap")
+def plot_lead_lag_heatmap():
+    fig, ax = plt.subplots(figsize=(14, 6))
+    im = ax.imshow(lead_lag_pivot, cmap="RdYlGn", aspect='auto', origin='lower',
+                   extent=[0, len(df.columns), -max_lag, max_lag])
+
+    fig.colorbar(im, label="Correlation with Market")
+    ax.set_yticks(range(-max_lag, max_lag + 1))
+    ax.axhline(0, color='black', linewidth=2, linestyle='-') # Contemporaneous line
+    ax.set_title("Lead-Lag Heatmap: Market(t) vs Stock(t + Lag)\nPositive Lag = Market Leads Stock")
+    ax.set_ylabel("Lag (Days)")
+    ax.set_xlabel("Stock Index")
+    return fig
+
+# Summary line plot of the average cross-correlation across all stocks
+@figure("22_avg_lead_lag_profile")
+def plot_avg_lead_lag_profile():
+    fig2, ax2 = plt.subplots(figsize=(10, 6))
+    avg_lead_lag = lead_lag_pivot.mean(axis=1)
+    ax2.plot(avg_lead_lag.index, avg_lead_lag.values, marker='o', linewidth=2)
+    ax2.axhline(0, color='black', alpha=0.3)
+    ax2.axvline(0, color='red', linestyle='--', label='Contemporaneous')
+    ax2.set_title("Average Cross-Correlation: Market vs. Universe")
+    ax2.set_xlabel("Lag (Days: Positive = Market Leads)")
+    ax2.set_ylabel("Average Correlation")
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+    return fig2
 
 # ───────────────────────────────────────────────────────────────────────
-# Save All Plots
+# Render (parallel, content-addressed)
 # ───────────────────────────────────────────────────────────────────────
 OUTPUT_DIR = "plots"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-for name, fig in figures.items():
-    fig.savefig(os.path.join(OUTPUT_DIR, f"{name}.png"), dpi=200, bbox_inches="tight")
+DPI = 200
+CACHE_MANIFEST = os.path.join(OUTPUT_DIR, ".figure_cache.json")
+
+def figure_key(name: str) -> str:
+    """Cache key: input data hash + shared analysis code + the figure's own code and params."""
+    fn, params = FIGURES[name]
+    with open(__file__) as f:
+        module_src = f.read()
+    shared_src = module_src[:module_src.index("# 3) Figure Registry")]
+    payload = json.dumps({
+        "data": price_data.read_meta(DATA_PATH)["sha256"],
+        "shared": hashlib.sha256(shared_src.encode()).hexdigest(),
+        "code": inspect.getsource(fn),
+        "params": params,
+        "dpi": DPI,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def render_figure(name: str) -> str:
+    fn, params = FIGURES[name]
+    fig = fn(**params)
+    path = os.path.join(OUTPUT_DIR, f"{name}.png")
+    fig.savefig(path, dpi=DPI, bbox_inches="tight")
+    plt.close(fig)
+    return path
+
+def render_figures(names=None, force: bool = False, jobs=None) -> list:
+    """Render figures in a process pool, skipping any whose cache key is unchanged.
+
+    Explicitly named figures are always re-rendered. Returns the names that were rendered.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    manifest = {}
+    if os.path.exists(CACHE_MANIFEST):
+        with open(CACHE_MANIFEST) as f:
+            manifest = json.load(f)
+
+    keys = {name: figure_key(name) for name in (names or FIGURES)}
+    todo = [name for name, key in keys.items()
+            if names or force or manifest.get(name) != key
+            or not os.path.exists(os.path.join(OUTPUT_DIR, f"{name}.png"))]
+
+    if todo:
+        with ProcessPoolExecutor(min(len(todo), jobs or os.cpu_count())) as pool:
+            list(pool.map(render_figure, todo))
+        manifest.update({name: keys[name] for name in todo})
+        with open(CACHE_MANIFEST, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    return todo
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render market analysis figures to plots/.")
+    parser.add_argument("names", nargs="*", help="figures to (re)render, e.g. 21_lead_lag_heatmap")
+    parser.add_argument("--force", action="store_true", help="re-render every figure")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--list", action="store_true", help="list registered figures")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(FIGURES))
+    else:
+        unknown = [n for n in args.names if n not in FIGURES]
+        if unknown:
+            parser.error(f"unknown figure(s): {', '.join(unknown)}")
+        save_acf_surface(os.path.join(ARTIFACT_DIR, f"rolling_acf_w{acf_window}.npz"), stock_acf,
+                         acf_window, log_returns.columns)
+
+        # all directed pairs screened at once; the heatmap only shows the market row
+        lead_lag_sig, lead_lag_pairs = lead_lag_screen()
+        pairs_path = os.path.join(ARTIFACT_DIR, "lead_lag_pairs.csv")
+        lead_lag_pairs.to_csv(pairs_path, index=False)
+        off_diag = ~np.eye(lead_lag.shape[1], dtype=bool)
+        n_sig = int((lead_lag_sig & (ll_lags > 0)[:, None, None] & off_diag).sum())
+        print(f"{n_sig} significant leader/follower/lag entries (Bonferroni, lags 1-{max_lag}); "
+              f"top {len(lead_lag_pairs)} pairs saved to {pairs_path}")
+        print(lead_lag_pairs.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        rendered = render_figures(args.names, args.force, args.jobs)
+        print(f"Rendered {len(rendered)} of {len(args.names or FIGURES)} figures")
 
 # plt.show()
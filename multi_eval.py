@@ -0,0 +1,188 @@
+"""Evaluate several strategies in one pass over the price history, sharing per-day features.
+
+A strategy is a callable taking the price history so far, (nInst, t), or a module with a
+getMyPosition. If its signature has a `features` parameter it is also handed the day's
+FeatureCache, so the index, returns, momentum and vol are computed once per day for every
+strategy instead of once per strategy. Each strategy keeps its own cash/position/P&L book
+with eval.calcPL's accounting; the books are rows of one array, so they update together
+(P&L agrees with calcPL to ~1e-10, the books' dot products being done as one matrix product).
+"""
+import inspect
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+import price_data
+from eval import comm_rate, dollar_pos_limit
+from parameter_sweeps import _sizing
+
+# ─── User parameters ────────────────────────────────────────────────
+prices_file   = "price_files/2025_prices.txt"
+test_days     = 1500
+lookbacks     = (5, 10, 15, 20)
+thresholds    = (0.0, 0.002, 0.005)
+
+
+# ───────── shared features ─────────
+class FeatureCache:
+    """Per-day quantities shared by every strategy in a calcPLMulti pass.
+
+    Histories grow by one column per day; derived values (momentum, vol, shares) are memoised per
+    argument and cleared when the day advances.
+    """
+
+    def __init__(self, prcHist):
+        self.prcHist = prcHist
+        n_inst, nt = prcHist.shape
+        self.t = 0                             # days seen
+        self.index_hist = np.zeros(nt)         # equal-weight index
+        self.returns_hist = np.zeros((n_inst, nt))  # column t = p_t / p_{t-1} - 1
+        self._memo = {}
+
+    def advance(self):
+        t = self.t
+        price = self.prcHist[:, t]
+        # summed in the same order as prices.mean(axis=0)
+        self.index_hist[t] = np.cumsum(price)[-1] / price.size
+        if t > 0:
+            self.returns_hist[:, t] = price / self.prcHist[:, t - 1] - 1
+        self.t += 1
+        self._memo.clear()
+
+    @property
+    def prices(self):
+        return self.prcHist[:, :self.t]
+
+    @property
+    def price_today(self):
+        return self.prcHist[:, self.t - 1]
+
+    @property
+    def index(self):
+        return self.index_hist[:self.t]
+
+    def momentum(self, lookback):
+        """Index return over the last lookback days."""
+        key = ("momentum", lookback)
+        if key not in self._memo:
+            self._memo[key] = self.index_hist[self.t - 1] / self.index_hist[self.t - 1 - lookback] - 1.0
+        return self._memo[key]
+
+    def vol(self, window):
+        """Per-instrument std of the window-1 returns ending yesterday (as getMyPosition uses)."""
+        key = ("vol", window)
+        if key not in self._memo:
+            rets = self.returns_hist[:, self.t - window : self.t - 1]
+            self._memo[key] = np.std(rets, axis=1, ddof=0) + 1e-8
+        return self._memo[key]
+
+    def shares(self, window, target_dollar):
+        """Vol-scaled share counts (before direction), as getMyPosition sizes them."""
+        key = ("shares", window, target_dollar)
+        if key not in self._memo:
+            self._memo[key] = _sizing(self.price_today, self.vol(window), target_dollar)
+        return self._memo[key]
+
+
+def momentum_strategy(lookback, thresh, target_dollar=1500, vol_window=None):
+    """getMyPosition_Parametric (plus target_dollar/vol_window) reading the feature cache."""
+    vol_window = vol_window or lookback
+
+    def strategy(prcSoFar, features):
+        n_inst = features.price_today.size
+        if features.t <= max(lookback, vol_window):
+            return np.zeros(n_inst, dtype=int)
+        mom = features.momentum(lookback)
+        if abs(mom) < thresh:
+            return np.zeros(n_inst, dtype=int)
+        direction = 1 if mom > 0 else -1
+        return direction * features.shares(vol_window, target_dollar)
+
+    strategy.__name__ = f"momentum_lb{lookback}_th{thresh}"
+    return strategy
+
+
+# ───────── evaluator ─────────
+def _as_callable(strategy):
+    fn = strategy.getMyPosition if inspect.ismodule(strategy) else strategy
+    wants_features = "features" in inspect.signature(fn).parameters
+    return fn, wants_features
+
+
+def calcPLMulti(prcHist, numTestDays, strategies, names=None):
+    """calcPL for every strategy in one pass; returns a summary DataFrame and the (N, days-1) P&L.
+
+    Summary columns match calcPL's return values, plus score = mean - 0.1 * std.
+    """
+    calls = [_as_callable(s) for s in strategies]
+    names = names or [getattr(s, "__name__", str(s)) for s in strategies]
+    n_strat = len(calls)
+    n_inst, nt_local = prcHist.shape
+    startDay = nt_local - numTestDays + 1
+    features = FeatureCache(prcHist)
+
+    # one book per strategy
+    cash = np.zeros(n_strat)
+    curPos = np.zeros((n_strat, n_inst))
+    totDVolume = np.zeros(n_strat)
+    value = np.zeros(n_strat)
+    pll = np.zeros((n_strat, numTestDays - 1))
+
+    for t in range(1, nt_local + 1):
+        features.advance()
+        if t < startDay:
+            continue
+        hist = features.prices
+        price = features.price_today
+
+        # every book trades at once: rows of the (strategy, instrument) arrays are the books
+        if t < nt_local:
+            rawPos = np.array([fn(hist, features=features) if wants_features else fn(hist)
+                               for fn, wants_features in calls])
+            pos_limit = np.floor(dollar_pos_limit / price).astype(int)
+            newPos = np.clip(rawPos, -pos_limit, pos_limit)
+
+            delta = newPos - curPos
+            traded = np.abs(delta) * price
+            dvolume = traded.sum(axis=1)
+            totDVolume += dvolume
+            cash -= delta @ price + comm_rate * dvolume
+            curPos = newPos
+
+        posValue = curPos @ price
+        todayPL = cash + posValue - value
+        value = cash + posValue
+        if t > startDay:
+            pll[:, t - startDay - 1] = todayPL
+
+    mu = pll.mean(axis=1)
+    sigma = pll.std(axis=1, ddof=0)
+    sharpe = np.where(sigma > 0, np.sqrt(249) * mu / np.where(sigma > 0, sigma, 1), 0.0)
+    ret = np.where(totDVolume > 0, value / np.where(totDVolume > 0, totDVolume, 1), 0.0)
+    summary = pd.DataFrame({"mean": mu, "ret": ret, "std": sigma, "sharpe": sharpe,
+                            "dvol": totDVolume, "score": mu - 0.1 * sigma}, index=names)
+    return summary, pll
+
+
+# ───────── main ─────────
+if __name__ == "__main__":
+    from parameter_sweeps import run_backtest
+
+    prcAll = np.ascontiguousarray(price_data.load_prices(prices_file))
+    variants = [momentum_strategy(lb, th) for lb in lookbacks for th in thresholds]
+
+    t0 = time.perf_counter()
+    summary, _ = calcPLMulti(prcAll, test_days, [main] + variants)
+    shared = time.perf_counter() - t0
+    print(summary.to_string(float_format=lambda x: f"{x:.4f}"))
+
+    # the same variants one run at a time
+    t0 = time.perf_counter()
+    separate = [run_backtest(prcAll, test_days, lb, th) for lb in lookbacks for th in thresholds]
+    separate_time = time.perf_counter() - t0
+    print(f"\n{len(variants) + 1} strategies in one pass: {shared:.2f}s; "
+          f"{len(variants)} separate run_backtest calls: {separate_time:.2f}s")
+    print(f"max |score difference| vs run_backtest: "
+          f"{np.abs(summary['score'].to_numpy()[1:] - np.array(separate)).max():.2e}")
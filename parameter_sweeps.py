@@ -1,17 +1,27 @@
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from tqdm import tqdm  # Install via: pip install tqdm
+from eval import plFromPositions
+import price_data
 
 # --- Strategy Logic (Modified to accept params) ---
 def getMyPosition_Parametric(price_history, lookback, thresh):
     TARGET_DOLLAR = 1500
     VOL_WINDOW = lookback
     
-    prices = np.asarray(price_history, dtype=float)
-    if prices.shape[0] != 50:
-        prices = prices.T
+    prices = np.asarray(price_history, dtype=float)  # (nInst, nt), one row per instrument
     n_inst, n_days = prices.shape
 
     if n_days <= max(lookback, VOL_WINDOW):
@@ -77,24 +87,294 @@ def run_backtest(prcHist, numTestDays, lookback, thresh, comm_rate=0.0005, dolla
     score = mu - 0.1 * sigma
     return score
 
+# --- Persistent Cell Cache ---
+CELL_CACHE_PATH = "artifacts/sweep_cells.sqlite"
+
+class CellCache:
+    """On-disk memo of sweep cell scores, safe to share between processes.
+
+    Scores live in SQLite (WAL mode, writes in IMMEDIATE transactions), keyed by a hash of
+    everything that determines them (see _cell_keys). Past max_entries, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, path=CELL_CACHE_PATH, max_entries=200_000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cells (key TEXT PRIMARY KEY, score REAL, used REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cells_used ON cells (used)")
+
+    def _connect(self):
+        # a fresh connection per call, so the cache can be handed to forked or spawned workers
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, keys):
+        """{key: score} for the keys present (NaN scores included), marking them as used."""
+        found = {}
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for lo in range(0, len(keys), 500):
+                chunk = list(keys[lo:lo + 500])
+                marks = ",".join("?" * len(chunk))
+                for key, score in conn.execute(f"SELECT key, score FROM cells WHERE key IN ({marks})", chunk):
+                    found[key] = np.nan if score is None else score
+            now = time.time()
+            conn.executemany("UPDATE cells SET used = ? WHERE key = ?", [(now, k) for k in found])
+            conn.execute("COMMIT")
+        return found
+
+    def put_many(self, items):
+        """Store {key: score}, then evict least recently used entries beyond max_entries."""
+        if not items:
+            return
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO cells VALUES (?, ?, ?)",
+                             [(k, float(v), now) for k, v in items.items()])
+            conn.execute("DELETE FROM cells WHERE key IN "
+                         "(SELECT key FROM cells ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            conn.execute("COMMIT")
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+
+def _cell_keys(prcHist, scoring_fns, cells, **settings):
+    """One key per cell: hash of the price data, the scoring code, the cell's parameters and
+    test window, and settings such as commission and position limit."""
+    prices = np.ascontiguousarray(prcHist, dtype=float)
+    common = {
+        "prices": hashlib.sha256(prices.tobytes()).hexdigest(),
+        "shape": list(prices.shape),
+        "code": hashlib.sha256("".join(inspect.getsource(f) for f in scoring_fns).encode()).hexdigest(),
+        "settings": {k: float(v) for k, v in settings.items()},
+    }
+    return [hashlib.sha256(json.dumps(dict(common, cell=[float(x) for x in cell]),
+                                      sort_keys=True).encode()).hexdigest()
+            for cell in cells]
+
+# --- Parallel Sweep ---
+_worker_prc = None
+
+def _attach_prices(path):
+    # every worker maps the same file read-only, so the OS shares the pages between processes
+    global _worker_prc
+    _worker_prc = np.load(path, mmap_mode='r')
+
+def _run_cell(cell):
+    # (numTestDays, lookback, thresh[, end]): score the numTestDays ending at day `end` (default: last)
+    numTestDays, lookback, thresh, *end = cell
+    prc = _worker_prc[:, :end[0]] if end else _worker_prc
+    return run_backtest(prc, numTestDays, lookback, thresh)
+
+def _compute_cells(prcHist, cells, n_workers=None, progress=True):
+    # run_backtest for every cell (see _run_cell), across a process pool when n_workers > 1
+    n_workers = n_workers or os.cpu_count()
+    if n_workers == 1:
+        global _worker_prc
+        _worker_prc = np.ascontiguousarray(prcHist, dtype=float)
+        return [_run_cell(c) for c in tqdm(cells, disable=not progress)]
+    chunksize = max(1, len(cells) // (4 * n_workers))
+
+    # publish the price matrix once as a memory-mapped .npy instead of pickling it to each task
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.npy")
+        np.save(path, np.ascontiguousarray(prcHist, dtype=float))
+        with ProcessPoolExecutor(n_workers, initializer=_attach_prices, initargs=(path,)) as pool:
+            return list(tqdm(pool.map(_run_cell, cells, chunksize=chunksize), total=len(cells),
+                             disable=not progress))
+
+def _score_cells(prcHist, cells, n_workers=None, progress=True, cache=None):
+    """run_backtest score for every cell; with a CellCache only cells not already stored are run."""
+    if cache is None:
+        return _compute_cells(prcHist, cells, n_workers, progress)
+
+    costs = dict(zip(("comm_rate", "dollar_pos_limit"), run_backtest.__defaults__))
+    keys = _cell_keys(prcHist, (run_backtest, getMyPosition_Parametric), cells, **costs)
+    known = cache.get_many(keys)
+    todo = [j for j, key in enumerate(keys) if key not in known]
+    if todo:
+        scores = _compute_cells(prcHist, [cells[j] for j in todo], n_workers, progress)
+        new = {keys[j]: sc for j, sc in zip(todo, scores)}
+        cache.put_many(new)
+        known.update(new)
+    return [known[key] for key in keys]
+
+def run_sweep_parallel(prcHist, numTestDays, lookback_range, thresh_range, n_workers=None, cache=None):
+    """Score every (lookback, thresh) cell across a process pool; returns the (lookback x thresh) grid."""
+    cells = [(numTestDays, lb, th) for lb in lookback_range for th in thresh_range]
+    scores = _score_cells(prcHist, cells, n_workers, cache=cache)
+    return np.array(scores).reshape(len(lookback_range), len(thresh_range))
+
+# --- Successive Halving Search ---
+def successive_halving(prcHist, numTestDays, lookback_range, thresh_range, min_days=100, eta=3,
+                       n_workers=None, progress=True, cache=None):
+    """Budgeted search: score every cell on a short prefix of the test window, keep the best 1/eta,
+    and re-score the survivors on an eta-times longer prefix until the full window is reached.
+
+    Returns (results, reached): results is the usual (lookback x thresh) grid of full-window
+    run_backtest scores, NaN for cells dropped before the last rung; reached holds the longest
+    prefix (in days) each cell was scored on.
+    """
+    prices = np.ascontiguousarray(prcHist, dtype=float)
+    nt_total = prices.shape[1]
+    startDay = nt_total - numTestDays + 1
+    n_rungs = max(0, int(np.floor(np.log(numTestDays / min_days) / np.log(eta))))
+    budgets = [int(round(numTestDays / eta ** k)) for k in range(n_rungs, 0, -1)] + [numTestDays]
+
+    shape = (len(lookback_range), len(thresh_range))
+    results = np.full(shape, np.nan)
+    reached = np.zeros(shape, dtype=int)
+    alive = [(i, k) for i in range(shape[0]) for k in range(shape[1])]
+    for r, days in enumerate(budgets):
+        # the first `days` days of the test window: history up to startDay - 1 + days
+        end = startDay - 1 + days
+        cells = [(days, lookback_range[i], thresh_range[k], end) for i, k in alive]
+        scores = np.array(_score_cells(prices, cells, n_workers, progress, cache))
+        for (i, k) in alive:
+            reached[i, k] = days
+        if days == numTestDays:
+            for (i, k), sc in zip(alive, scores):
+                results[i, k] = sc
+            break
+        keep = max(1, int(np.ceil(len(alive) / eta)))
+        order = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable")
+        alive = [alive[j] for j in order[:keep]]
+
+    return results, reached
+
+# --- Tensorized Sweep ---
+def _sizing(price_today, vol, target_dollar):
+    # getMyPosition_Parametric steps 3 + position limit, for every day at once
+    shares = np.floor(target_dollar / (price_today * vol)).astype(int)
+    capped = np.floor(10000 / price_today).astype(int)
+    shares = np.where(shares * price_today > 10000, capped, shares)
+    shares[shares < 1] = 1
+    return shares
+
+def sweep_tensorized(prcHist, numTestDays, lookback_range, thresh_range,
+                     target_dollar_range=(1500,), vol_window_range=(None,),
+                     comm_rate=0.0005, dollar_pos_limit=10000.0, max_bytes=256 * 2**20,
+                     progress=True, cache=None):
+    """Score the (lookback x thresh x target_dollar x vol_window) grid, one signal pass per lookback.
+
+    Momentum is computed once per lookback and vol once per vol window; every threshold and
+    dollar target is then scored together as one broadcast P&L computation, split into chunks
+    that keep each block under max_bytes. A vol window of None means "same as lookback",
+    matching getMyPosition_Parametric. Scores agree with run_backtest to float rounding.
+    With a CellCache, only cells not already stored are computed.
+    """
+    if cache is not None:
+        return _sweep_tensorized_cached(prcHist, numTestDays, lookback_range, thresh_range,
+                                        target_dollar_range, vol_window_range, comm_rate,
+                                        dollar_pos_limit, max_bytes, progress, cache)
+    prices = np.ascontiguousarray(prcHist, dtype=float)
+    nInst, nt_total = prices.shape
+    startDay = nt_total - numTestDays + 1
+    days = np.arange(startDay - 1, nt_total - 1)  # history length - 1 for each trading decision
+    price = prices[:, startDay - 1:]
+    price_today = prices[:, days]
+
+    index = prices.mean(axis=0)
+    rets = prices[:, 1:] / prices[:, :-1] - 1
+    thresh = np.asarray(thresh_range, dtype=float)
+    target_dollar = np.asarray(target_dollar_range, dtype=float)
+    n_rows = len(target_dollar) * len(thresh)
+    rows_per_chunk = max(1, max_bytes // (6 * nInst * len(days) * 8))
+
+    vol_cache = {}
+    results = np.full((len(lookback_range), len(thresh), len(target_dollar), len(vol_window_range)), np.nan)
+    for i, lb in enumerate(tqdm(lookback_range, disable=not progress)):
+        # 1) index momentum, shared by every threshold
+        mom = np.zeros(len(days))
+        mom[days >= lb] = index[days[days >= lb]] / index[days[days >= lb] - lb] - 1.0
+        direction = np.where(mom > 0, 1, -1)
+
+        for v, vw in enumerate(vol_window_range):
+            vw = lb if vw is None else vw
+            ready = days >= max(lb, vw)
+            active = ~(np.abs(mom)[None, :] < thresh[:, None]) & ready  # (thresh, day)
+
+            # 2) vol over the vw prices before today, shared by every threshold and target
+            if vw not in vol_cache:
+                windows = np.lib.stride_tricks.sliding_window_view(rets, vw - 1, axis=1)
+                vol = np.ones((nInst, len(days)))
+                vol[:, days >= vw] = np.std(windows[:, days[days >= vw] - vw], axis=-1, ddof=0) + 1e-8
+                vol_cache[vw] = vol
+            vol = vol_cache[vw]
+
+            # 3) raw share counts per dollar target, then every (target, thresh) row in chunks
+            shares = np.stack([_sizing(price_today, vol, td) * direction for td in target_dollar])
+            scores = np.empty(n_rows)
+            for lo in range(0, n_rows, rows_per_chunk):
+                rows = np.arange(lo, min(lo + rows_per_chunk, n_rows))
+                d_idx, k_idx = np.divmod(rows, len(thresh))
+                rawPos = shares[d_idx] * active[k_idx][:, None, :]
+                pll, _, _ = plFromPositions(price, rawPos, comm_rate, dollar_pos_limit)
+                scores[rows] = pll.mean(axis=-1) - 0.1 * pll.std(axis=-1, ddof=0)
+            results[i, :, :, v] = scores.reshape(len(target_dollar), len(thresh)).T
+
+    return results
+
+def _sweep_tensorized_cached(prcHist, numTestDays, lookback_range, thresh_range, target_dollar_range,
+                             vol_window_range, comm_rate, dollar_pos_limit, max_bytes, progress, cache):
+    # look every cell up, then rerun each lookback only for the thresholds it is missing
+    grid = list(itertools.product(range(len(lookback_range)), range(len(thresh_range)),
+                                  range(len(target_dollar_range)), range(len(vol_window_range))))
+    cells = [(lookback_range[i], thresh_range[k], target_dollar_range[d], vol_window_range[v] or 0,
+              numTestDays) for i, k, d, v in grid]
+    keys = dict(zip(grid, _cell_keys(prcHist, (sweep_tensorized, _sizing, plFromPositions), cells,
+                                     comm_rate=comm_rate, dollar_pos_limit=dollar_pos_limit)))
+    known = cache.get_many(list(keys.values()))
+
+    results = np.full((len(lookback_range), len(thresh_range), len(target_dollar_range),
+                       len(vol_window_range)), np.nan)
+    missing = {}
+    for (i, k, d, v), key in keys.items():
+        if key in known:
+            results[i, k, d, v] = known[key]
+        else:
+            missing.setdefault(i, set()).add(k)
+
+    new = {}
+    for i, ks in tqdm(sorted(missing.items()), disable=not progress):
+        ks = sorted(ks)
+        sub = sweep_tensorized(prcHist, numTestDays, [lookback_range[i]], [thresh_range[k] for k in ks],
+                               target_dollar_range, vol_window_range, comm_rate, dollar_pos_limit,
+                               max_bytes, progress=False)[0]
+        results[i, ks] = sub
+        for j, k in enumerate(ks):
+            for d, v in itertools.product(range(sub.shape[1]), range(sub.shape[2])):
+                new[keys[i, k, d, v]] = sub[j, d, v]
+    cache.put_many(new)
+    return results
+
 # --- Main Sweep Execution ---
 if __name__ == "__main__":
     # Load Data
     prices_file = "price_files/2025_prices.txt"
-    df = pd.read_csv(prices_file, sep=r'\s+', header=None)
-    prcAll = df.values.T 
+    prcAll = price_data.load_prices(prices_file)
     
     # Define Sweep Ranges
     lookback_range = [2,3,4,5,6,7,8,9,10,11,12,13,14,15]
     thresh_range = [0, 0.0001,0.0002,0.0003 ,0.0004,0.0005, 0.001, 0.0015, 0.002, 0.0025, 0.003, 0.0035, 0.004]
     test_days = 1000 # Reduced for speed during sweep
+    search = "grid"  # "grid" scores every cell; "halving" runs the budgeted successive-halving search
+    cache = CellCache()  # scores already computed for this data and code are reused
     
-    results = np.zeros((len(lookback_range), len(thresh_range)))
-
     print("Starting Parameter Sweep...")
-    for i, lb in enumerate(tqdm(lookback_range)):
-        for j, th in enumerate(thresh_range):
-            results[i, j] = run_backtest(prcAll, test_days, lb, th)
+    if search == "halving":
+        # cells dropped on a short prefix stay NaN (blank in the heatmap)
+        results, reached = successive_halving(prcAll, test_days, lookback_range, thresh_range, cache=cache)
+        print(f"Scored {np.isfinite(results).sum()} of {results.size} cells on the full window")
+    else:
+        # one signal pass per lookback scores every threshold; run_sweep_parallel scores cell by cell
+        results = sweep_tensorized(prcAll, test_days, lookback_range, thresh_range, cache=cache)[:, :, 0, 0]
 
     # Convert to DataFrame for Plotting
     res_df = pd.DataFrame(results, index=lookback_range, columns=thresh_range)
@@ -0,0 +1,217 @@
+"""Long-running position service: one day of prices in, that day's positions out.
+
+Line protocol (over stdin/stdout or a local TCP socket), one request per line:
+
+    <p_1> <p_2> ... <p_nInst>   -> "<pos_1> ... <pos_nInst>"
+    STATUS                      -> "OK days=<n> inst=<n> p50_us=<..> p99_us=<..> max_us=<..>"
+    CHECKPOINT                  -> "OK days=<n>"
+    RESET                       -> "OK days=0"
+    anything invalid            -> "ERR <reason>"
+
+State is an incremental MomentumStrategy, checkpointed every CHECKPOINT_EVERY days and on
+shutdown, so a restart resumes from the checkpoint instead of replaying the history.
+
+    python position_server.py serve --port 5050
+    python position_server.py stdio
+    python position_server.py replay price_files/2025_prices.txt --port 5050 --check
+    python position_server.py replay price_files/2025_prices.txt --stdio --check
+"""
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from main import MomentumStrategy, getPositionsBatch
+import price_data
+
+# ─── User parameters ────────────────────────────────────────────────
+HOST             = "127.0.0.1"
+PORT             = 5050
+CHECKPOINT_PATH  = "artifacts/position_server.npz"
+CHECKPOINT_EVERY = 20         # days between checkpoints
+LATENCY_SAMPLES  = 10000      # most recent per-day latencies kept for STATUS
+
+
+class PositionService:
+    """Protocol handling around one MomentumStrategy, independent of the transport."""
+
+    def __init__(self, checkpoint_path=CHECKPOINT_PATH, checkpoint_every=CHECKPOINT_EVERY):
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.strategy = None
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.strategy = MomentumStrategy.load(checkpoint_path)
+        self.latency_ns = np.zeros(LATENCY_SAMPLES, dtype=np.int64)
+        self.n_latency = 0
+
+    def checkpoint(self):
+        if self.checkpoint_path and self.strategy is not None:
+            os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+            self.strategy.save(self.checkpoint_path)
+
+    def status(self):
+        days = self.strategy.n_days if self.strategy else 0
+        inst = self.strategy.n_inst if self.strategy else 0
+        msg = f"OK days={days} inst={inst}"
+        if self.n_latency:
+            us = self.latency_ns[:min(self.n_latency, LATENCY_SAMPLES)] / 1e3
+            p50, p99 = np.percentile(us, [50, 99])
+            msg += f" p50_us={p50:.1f} p99_us={p99:.1f} max_us={us.max():.1f}"
+        return msg
+
+    def handle(self, line: str) -> str:
+        """Reply to one request line; positions are computed before any checkpoint write."""
+        line = line.strip()
+        command = line.upper()
+        if command == "STATUS":
+            return self.status()
+        if command == "CHECKPOINT":
+            self.checkpoint()
+            return f"OK days={self.strategy.n_days if self.strategy else 0}"
+        if command == "RESET":
+            self.strategy = None
+            if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+            return "OK days=0"
+
+        t0 = time.perf_counter_ns()
+        try:
+            prices = np.array(line.split(), dtype=float)
+        except ValueError:
+            return "ERR prices must be numbers"
+        if prices.size == 0:
+            return "ERR empty request"
+        if self.strategy is not None and prices.size != self.strategy.n_inst:
+            return f"ERR expected {self.strategy.n_inst} prices, got {prices.size}"
+        if not (np.isfinite(prices).all() and (prices > 0).all()):
+            return "ERR prices must be positive and finite"
+        # only a valid first day fixes the instrument count for the session
+        if self.strategy is None:
+            self.strategy = MomentumStrategy(prices.size)
+
+        positions = self.strategy.update(prices)
+        self.latency_ns[self.n_latency % LATENCY_SAMPLES] = time.perf_counter_ns() - t0
+        self.n_latency += 1
+        return " ".join(map(str, positions.tolist()))
+
+    def after_reply(self):
+        """Periodic checkpoint, done after the reply has been sent."""
+        if self.strategy is not None and self.strategy.n_days % self.checkpoint_every == 0:
+            self.checkpoint()
+
+
+# ───────── transports ─────────
+def serve_stdio(service):
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        sys.stdout.write(service.handle(line) + "\n")
+        sys.stdout.flush()
+        service.after_reply()
+    service.checkpoint()
+
+
+def serve_socket(service, host=HOST, port=PORT):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode().strip()
+                if not line:
+                    continue
+                self.wfile.write((service.handle(line) + "\n").encode())
+                self.wfile.flush()
+                service.after_reply()
+
+    # checkpoint on SIGTERM as well as Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    socketserver.TCPServer.allow_reuse_address = True
+    with socketserver.TCPServer((host, port), Handler) as server:
+        server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        print(f"Serving positions on {host}:{port}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.checkpoint()
+
+
+# ───────── replay client ─────────
+def replay(prices_path, reader, writer, check=False):
+    """Stream a price file into a running service, resuming from the days it has already seen."""
+    def request(line):
+        writer.write(line + "\n")
+        writer.flush()
+        return reader.readline().strip()
+
+    prices = np.asarray(price_data.load_prices(prices_path))
+    n_inst, n_days = prices.shape
+    status = dict(kv.split("=") for kv in request("STATUS").split()[1:])
+    start = int(status["days"])
+    if start and int(status["inst"]) != n_inst:
+        raise ValueError(f"server holds a {status['inst']}-instrument state, file has {n_inst}")
+    print(f"Server has seen {start} days; streaming {max(n_days - start, 0)} more")
+
+    positions = np.zeros((n_inst, n_days), dtype=int)
+    rtt_us = np.zeros(max(n_days - start, 0))
+    for t in range(start, n_days):
+        t0 = time.perf_counter()
+        reply = request(" ".join(f"{p:.2f}" for p in prices[:, t]))
+        rtt_us[t - start] = (time.perf_counter() - t0) * 1e6
+        if reply.startswith("ERR"):
+            raise RuntimeError(f"day {t + 1}: {reply}")
+        positions[:, t] = np.array(reply.split(), dtype=int)
+
+    if rtt_us.size:
+        p50, p99 = np.percentile(rtt_us, [50, 99])
+        print(f"Round trip: p50={p50:.1f}us p99={p99:.1f}us max={rtt_us.max():.1f}us")
+    print(request("STATUS"))
+    if check:
+        expected = getPositionsBatch(prices)[:, start:]
+        n_bad = int((expected != positions[:, start:]).any(axis=0).sum())
+        print(f"{n_bad} days differ from getPositionsBatch")
+    return positions
+
+
+# ───────── main ─────────
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Live position server and replay client.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    for name in ("serve", "stdio"):
+        p = sub.add_parser(name)
+        p.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="checkpoint .npz ('' to disable)")
+        p.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY)
+        if name == "serve":
+            p.add_argument("--host", default=HOST)
+            p.add_argument("--port", type=int, default=PORT)
+    p = sub.add_parser("replay")
+    p.add_argument("prices_path")
+    p.add_argument("--host", default=HOST)
+    p.add_argument("--port", type=int, default=PORT)
+    p.add_argument("--stdio", action="store_true", help="spawn a stdio server instead of connecting")
+    p.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="checkpoint for the spawned server")
+    p.add_argument("--check", action="store_true", help="compare replies with getPositionsBatch")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve_socket(PositionService(args.checkpoint, args.checkpoint_every), args.host, args.port)
+    elif args.mode == "stdio":
+        serve_stdio(PositionService(args.checkpoint, args.checkpoint_every))
+    elif args.stdio:
+        proc = subprocess.Popen([sys.executable, __file__, "stdio", "--checkpoint", args.checkpoint],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        replay(args.prices_path, proc.stdout, proc.stdin, args.check)
+        proc.stdin.close()
+        proc.wait()
+    else:
+        with socket.create_connection((args.host, args.port)) as conn:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with conn.makefile("r") as reader, conn.makefile("w") as writer:
+                replay(args.prices_path, reader, writer, args.check)
@@ -0,0 +1,189 @@
+"""Binary cache for the whitespace price files in price_files/.
+
+Each text file is parsed once into an instrument-major .npy (shape (nInst, capacity)) plus a
+JSON sidecar holding shape, year, and the SHA-256, size and mtime of the source text. Loads
+memory-map the .npy, so they are zero-copy; the cache is rebuilt whenever the source text changes.
+Building, hashing and regrowing all work in fixed-size blocks, so no step holds a whole history.
+"""
+import hashlib
+import itertools
+import json
+import os
+import re
+
+import numpy as np
+
+
+CACHE_DIR   = "cache"  # created next to the price file
+HASH_BLOCK  = 1 << 20  # bytes read at a time when hashing a source file
+PARSE_BLOCK = 1 << 18  # prices parsed or copied at a time when building or regrowing a store
+
+
+def _paths(fn):
+    base = os.path.splitext(os.path.basename(fn))[0]
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(fn)), CACHE_DIR)
+    return cache_dir, os.path.join(cache_dir, base + ".npy"), os.path.join(cache_dir, base + ".json")
+
+
+def _source_hash(fn):
+    h = hashlib.sha256()
+    with open(fn, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _source_stat(fn):
+    st = os.stat(fn)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def scan_text(fn):
+    """(nInst, nt) of a whitespace price file, counted line by line without parsing it."""
+    n_inst, n_days = 0, 0
+    with open(fn) as f:
+        for line in f:
+            if line.strip():
+                n_inst = n_inst or len(line.split())
+                n_days += 1
+    return n_inst, n_days
+
+
+def parse_blocks(fn, n_inst):
+    """Yield the file's prices as (nInst, <=k) day blocks in order, reading it line by line."""
+    per_block = max(1, PARSE_BLOCK // n_inst)
+    lines = []
+    with open(fn) as f:
+        for line in f:
+            if line.strip():
+                lines.append(line)
+            if len(lines) == per_block:
+                yield np.fromstring(" ".join(lines), sep=" ").reshape(-1, n_inst).T
+                lines = []
+    if lines:
+        yield np.fromstring(" ".join(lines), sep=" ").reshape(-1, n_inst).T
+
+
+def parse_text(fn):
+    """Parse a whitespace price file (one day per row) into an (nInst, nt) array."""
+    n_inst, _ = scan_text(fn)
+    return np.concatenate(list(parse_blocks(fn, n_inst)), axis=1)
+
+
+def _write_meta(json_path, meta):
+    with open(json_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(json_path + ".tmp", json_path)
+    return meta
+
+
+def _write_store(npy_path, json_path, blocks, n_inst, n_days, meta, capacity=None):
+    """Write (nInst, k) day blocks, in order, straight into a fresh memory-mapped store."""
+    capacity = max(capacity or n_days, n_days)
+    tmp = npy_path + ".tmp.npy"
+    store = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64, shape=(n_inst, capacity))
+    day = 0
+    for block in blocks:
+        store[:, day:day + block.shape[1]] = block
+        day += block.shape[1]
+    if day != n_days:
+        raise ValueError(f"expected {n_days} days of prices, got {day}")
+    store.flush()
+    del store
+    os.replace(tmp, npy_path)
+
+    return _write_meta(json_path, dict(meta, n_inst=n_inst, n_days=n_days, capacity=capacity))
+
+
+def _store_blocks(npy_path, n_days):
+    """Yield the first n_days of a store as copied (nInst, <=k) day blocks."""
+    store = np.load(npy_path, mmap_mode="r")
+    per_block = max(1, PARSE_BLOCK // store.shape[0])
+    for day in range(0, n_days, per_block):
+        yield np.array(store[:, day:min(day + per_block, n_days)])
+    del store
+
+
+def build_cache(fn):
+    """(Re)build the binary store for fn and return its metadata."""
+    cache_dir, npy_path, json_path = _paths(fn)
+    os.makedirs(cache_dir, exist_ok=True)
+    year = re.search(r"(\d{4})", os.path.basename(fn))
+    meta = {
+        "source": os.path.basename(fn),
+        "sha256": _source_hash(fn),
+        **_source_stat(fn),
+        "year": int(year.group(1)) if year else None,
+        "dtype": "float64",
+        "layout": "instrument-major",
+    }
+    n_inst, n_days = scan_text(fn)
+    return _write_store(npy_path, json_path, parse_blocks(fn, n_inst), n_inst, n_days, meta)
+
+
+def read_meta(fn):
+    """Metadata for fn's store, rebuilding it first if missing or stale.
+
+    The source is only rehashed when its size or mtime differ from the sidecar's.
+    """
+    _, npy_path, json_path = _paths(fn)
+    if os.path.exists(npy_path) and os.path.exists(json_path):
+        with open(json_path) as f:
+            meta = json.load(f)
+        stat = _source_stat(fn)
+        if all(meta.get(k) == v for k, v in stat.items()):
+            return meta
+        if meta["sha256"] == _source_hash(fn):
+            return _write_meta(json_path, dict(meta, **stat))   # touched but unchanged
+    return build_cache(fn)
+
+
+def load_prices(fn):
+    """Prices as a read-only memory-mapped (nInst, nt) array."""
+    meta = read_meta(fn)
+    _, npy_path, _ = _paths(fn)
+    store = np.load(npy_path, mmap_mode="r")
+    return store[:, :meta["n_days"]]
+
+
+def append_days(fn, new_prices):
+    """Append days of prices, (nInst, k) or one day as (nInst,), to the text file and write them
+    into the store in place.
+
+    The store keeps spare capacity; when it runs out it is regrown to double size.
+    """
+    meta = read_meta(fn)
+    new_prices = np.asarray(new_prices, dtype=float)
+    if new_prices.ndim == 1:
+        new_prices = new_prices[:, None]
+    if new_prices.ndim != 2 or new_prices.shape[0] != meta["n_inst"]:
+        raise ValueError(f"expected prices of shape ({meta['n_inst']}, k), got {new_prices.shape}")
+    n_new = new_prices.shape[1]
+    _, npy_path, json_path = _paths(fn)
+
+    with open(fn, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+        else:
+            needs_newline = False
+        rows = "\n".join(" ".join(f"{p:7.2f}" for p in day) for day in new_prices.T) + "\n"
+        f.write((("\n" if needs_newline else "") + rows).encode())
+    # store exactly what the text now says, so a rebuild from source gives the same array
+    new_prices = np.array(rows.split(), dtype=float).reshape(n_new, -1).T
+
+    n_days = meta["n_days"] + n_new
+    meta["sha256"] = _source_hash(fn)
+    meta.update(_source_stat(fn))
+    if n_days <= meta["capacity"]:
+        store = np.load(npy_path, mmap_mode="r+")
+        store[:, meta["n_days"]:n_days] = new_prices
+        store.flush()
+        del store
+        meta["n_days"] = n_days
+        return _write_meta(json_path, meta)
+
+    # regrow by copying the old store across in blocks
+    blocks = itertools.chain(_store_blocks(npy_path, meta["n_days"]), [new_prices])
+    return _write_store(npy_path, json_path, blocks, meta["n_inst"], n_days, meta, capacity=2 * n_days)
@@ -0,0 +1,74 @@
+"""Synthetic price universes in the price_files/ text format, for scale-up testing.
+
+    python synthetic_prices.py 1000 10000       # -> price_files/synthetic/1000x10000.txt
+    python synthetic_prices.py 5000 12000 --seed 3 --out big.txt
+
+Daily log returns are a market factor (with a little AR(1) momentum) times a per-stock
+beta, plus idiosyncratic noise; log prices are pulled weakly back to their start so long
+histories stay in a realistic price range. Days are generated in chunks, so memory is
+O(nInst * chunk) while writing.
+"""
+import os
+
+import numpy as np
+
+import price_data
+
+# ─── User parameters ────────────────────────────────────────────────
+MARKET_VOL  = 0.008    # daily market factor vol
+MARKET_PHI  = 0.05     # AR(1) coefficient of the market factor
+IDIO_VOL    = 0.012    # median idiosyncratic daily vol (lognormal across stocks)
+MEAN_REVERT = 0.002    # daily pull of log price towards its start
+CHUNK_DAYS  = 1000
+
+
+def generate_chunks(n_inst, n_days, seed=0, chunk_days=CHUNK_DAYS):
+    """Yield prices as (n_inst, <=chunk_days) blocks covering n_days in order."""
+    rng = np.random.default_rng(seed)
+    log_start = np.log(rng.uniform(10, 100, size=n_inst))
+    beta = rng.uniform(0.5, 1.5, size=n_inst)
+    idio_vol = IDIO_VOL * np.exp(rng.normal(0, 0.4, size=n_inst))
+
+    log_p = log_start.copy()
+    market = 0.0
+    for start in range(0, n_days, chunk_days):
+        k = min(chunk_days, n_days - start)
+        shocks = rng.normal(0, MARKET_VOL, size=k)
+        noise = rng.normal(0, 1, size=(n_inst, k)) * idio_vol[:, None]
+        block = np.empty((n_inst, k))
+        for j in range(k):
+            if start + j > 0:
+                market = MARKET_PHI * market + shocks[j]
+                log_p += beta * market + noise[:, j] - MEAN_REVERT * (log_p - log_start)
+            block[:, j] = log_p
+        yield np.exp(block)
+
+
+def generate_prices(n_inst, n_days, seed=0):
+    """Whole (n_inst, n_days) price array, rounded to cents like the price files."""
+    return np.round(np.concatenate(list(generate_chunks(n_inst, n_days, seed)), axis=1), 2)
+
+
+def write_price_file(fn, n_inst, n_days, seed=0):
+    """Write a universe in the price-file format (one day per row, %7.2f) and build its cache."""
+    os.makedirs(os.path.dirname(fn) or ".", exist_ok=True)
+    with open(fn, "w") as f:
+        for block in generate_chunks(n_inst, n_days, seed):
+            np.savetxt(f, block.T, fmt="%7.2f", delimiter=" ")
+    return price_data.build_cache(fn)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic price universe.")
+    parser.add_argument("n_inst", type=int)
+    parser.add_argument("n_days", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="output path (default price_files/synthetic/<n>x<days>.txt)")
+    args = parser.parse_args()
+
+    # a subdirectory, so scripts globbing price_files/*.txt keep to the competition data
+    out = args.out or os.path.join("price_files", "synthetic", f"{args.n_inst}x{args.n_days}.txt")
+    meta = write_price_file(out, args.n_inst, args.n_days, args.seed)
+    print(f"Wrote {meta['n_inst']} instruments x {meta['n_days']} days to {out}")
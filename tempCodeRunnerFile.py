@@ -1,7 +1,7 @@
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
-from main import getMyPosition
+from trade_analyser import load_positions
+import price_data
 
 # --- Configuration ---
 PRICES_PATH = "price_files/2025_prices.txt"
@@ -10,14 +10,11 @@ LOOKBACK_DAYS = 200
 COMM_RATE = 0.0005
 
 # 1. Load Data
-df = pd.read_csv(PRICES_PATH, sep=r"\s+", header=None)
-prices_full = df.values.T if df.shape[1] == 50 else df.values
+prices_full = price_data.load_prices(PRICES_PATH)
 n_days = prices_full.shape[1]
 
-# 2. Generate Positions (Walk-forward)
-pos_full = np.zeros(n_days)
-for t in range(n_days):
-    pos_full[t] = getMyPosition(prices_full[:, :t+1])[STOCK_IDX]
+# 2. Walk-forward positions, from the cached (instrument x day) matrix
+pos_full = load_positions(PRICES_PATH)[STOCK_IDX]
 
 # 3. Slice for Analysis Window
 start = n_days - LOOKBACK_DAYS
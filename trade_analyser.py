@@ -1,8 +1,12 @@
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+import hashlib
+import inspect
 import os
-from main import getMyPosition
+import main
+from main import getPositionsBatch
+import price_data
 
 # --- Configuration ---
 PRICES_PATH = "price_files/2025_prices.txt"
@@ -11,77 +15,135 @@ STOCK_IDX = 38
 LOOKBACK_DAYS = 200
 COMM_RATE = 0.0005
 
-# Ensure the plots directory exists
-if not os.path.exists(SAVE_DIR):
-    os.makedirs(SAVE_DIR)
-
-# 1. Load Data
-df = pd.read_csv(PRICES_PATH, sep=r"\s+", header=None)
-prices_full = df.values.T if df.shape[1] == 50 else df.values
-n_days = prices_full.shape[1]
-
-# 2. Generate Positions (Walk-forward)
-pos_full = np.zeros(n_days)
-for t in range(n_days):
-    pos_full[t] = getMyPosition(prices_full[:, :t+1])[STOCK_IDX]
-
-# 3. Slice for Analysis Window
-start = n_days - LOOKBACK_DAYS
-p = prices_full[STOCK_IDX, start:]
-pos = pos_full[start:]
-
-# 4. Compute Returns and PnL
-daily_pnl = pos[:-1] * np.diff(p)
-trades = np.abs(np.diff(pos)) 
-commissions = trades * p[1:] * COMM_RATE
-net_pnl = daily_pnl - commissions
-
-# 5. Plotting
-fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(14, 15), sharex=True)
-
-# Top: Price, Regimes, and Trade Markers
-ax1.plot(p, color='black', alpha=0.2, label='Price')
-
-for i in range(1, len(pos)):
-    color = 'green' if pos[i-1] > 0 else 'red' if pos[i-1] < 0 else None
-    if color:
-        ax1.axvspan(i-1, i, color=color, alpha=0.05)
-    
-    prev, curr = pos[i-1], pos[i]
-    if curr > 0 and prev <= 0: # Entry Long
-        ax1.scatter(i, p[i], marker='^', color='green', s=100, zorder=5)
-    elif curr < 0 and prev >= 0: # Entry Short
-        ax1.scatter(i, p[i], marker='v', color='red', s=100, zorder=5)
-    elif curr == 0 and prev != 0: # Exit to Flat
-        ax1.scatter(i, p[i], marker='x', color='black', s=80, zorder=5)
-
-ax1.set_title(f"Stock {STOCK_IDX} Price & Trade Signals")
-ax1.set_ylabel("Price")
-
-# Middle: Cumulative PnL
-ax2.plot(np.cumsum(daily_pnl), label="Gross PnL", alpha=0.7)
-ax2.plot(np.cumsum(net_pnl), label="Net PnL (inc. Comm)", color='black', lw=1.5)
-ax2.axhline(0, color='red', lw=0.5, ls='--')
-ax2.legend()
-ax2.set_title("Equity Curve")
-ax2.set_ylabel("PnL ($)")
-
-# Bottom: Position Amount
-ax3.step(range(len(pos)), pos, where='post', color='blue', lw=1.5)
-ax3.axhline(0, color='black', lw=0.8, ls='--')
-ax3.set_title("Position Amount")
-ax3.set_ylabel("Quantity")
-ax3.set_xlabel("Days")
-ax3.grid(True, alpha=0.3)
-
-plt.tight_layout()
-
-# --- Save Logic ---
-filename = f"stock_{STOCK_IDX}_trade_trace.png"
-save_path = os.path.join(SAVE_DIR, filename)
-plt.savefig(save_path, dpi=300, bbox_inches='tight')
-print(f"Plot saved to: {save_path}")
-
-plt.show()
-
-print(f"Total Net PnL: {np.sum(net_pnl):.2f}")
\ No newline at end of file
+
+# --- Cached position matrix ---
+def positions_key(prices_path):
+    """Cache key: strategy source (main.py) + price file contents."""
+    strategy_src = inspect.getsource(main)
+    price_hash = price_data.read_meta(prices_path)["sha256"]
+    return hashlib.sha256((strategy_src + price_hash).encode()).hexdigest()
+
+
+def load_positions(prices_path=PRICES_PATH):
+    """Walk-forward positions for every (instrument, day), computed once per strategy/price file.
+
+    Column t equals getMyPosition(prices[:, :t+1]); the matrix is stored next to the price cache.
+    """
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(prices_path)), price_data.CACHE_DIR)
+    base = os.path.splitext(os.path.basename(prices_path))[0]
+    path = os.path.join(cache_dir, f"{base}_positions_{positions_key(prices_path)[:16]}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+
+    positions = getPositionsBatch(np.asarray(price_data.load_prices(prices_path)))
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(path + ".tmp.npy", positions)
+    os.replace(path + ".tmp.npy", path)
+    return positions
+
+
+# --- Trace rendering ---
+def plot_trace(prices_full, pos_full, stock_idx, lookback_days=LOOKBACK_DAYS, comm_rate=COMM_RATE):
+    """Three-panel trade trace (price & signals, equity curve, position) for one stock."""
+    # 1. Slice for Analysis Window
+    n_days = prices_full.shape[1]
+    start = n_days - lookback_days
+    p = prices_full[stock_idx, start:]
+    pos = pos_full[stock_idx, start:]
+
+    # 2. Compute Returns and PnL
+    daily_pnl = pos[:-1] * np.diff(p)
+    trades = np.abs(np.diff(pos))
+    commissions = trades * p[1:] * comm_rate
+    net_pnl = daily_pnl - commissions
+
+    # 3. Plotting
+    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(14, 15), sharex=True)
+
+    # Top: Price, Regimes, and Trade Markers
+    ax1.plot(p, color='black', alpha=0.2, label='Price')
+
+    # Regime shading: one bar per run of days held long / short (position set the day before)
+    held = pos[:-1]
+    for mask, color in ((held > 0, 'green'), (held < 0, 'red')):
+        edges = np.diff(np.concatenate(([0], mask.astype(int), [0])))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        ax1.broken_barh(list(zip(starts, ends - starts)), (0, 1), color=color, alpha=0.05,
+                        transform=ax1.get_xaxis_transform())
+
+    # Trade markers: one scatter per marker type
+    prev, curr = pos[:-1], pos[1:]
+    entry_long = (curr > 0) & (prev <= 0)
+    entry_short = (curr < 0) & (prev >= 0)
+    exit_flat = (curr == 0) & (prev != 0)
+    days = np.arange(1, len(pos))
+    ax1.scatter(days[entry_long], p[1:][entry_long], marker='^', color='green', s=100, zorder=5)
+    ax1.scatter(days[entry_short], p[1:][entry_short], marker='v', color='red', s=100, zorder=5)
+    ax1.scatter(days[exit_flat], p[1:][exit_flat], marker='x', color='black', s=80, zorder=5)
+
+    ax1.set_title(f"Stock {stock_idx} Price & Trade Signals")
+    ax1.set_ylabel("Price")
+
+    # Middle: Cumulative PnL
+    ax2.plot(np.cumsum(daily_pnl), label="Gross PnL", alpha=0.7)
+    ax2.plot(np.cumsum(net_pnl), label="Net PnL (inc. Comm)", color='black', lw=1.5)
+    ax2.axhline(0, color='red', lw=0.5, ls='--')
+    ax2.legend()
+    ax2.set_title("Equity Curve")
+    ax2.set_ylabel("PnL ($)")
+
+    # Bottom: Position Amount
+    ax3.step(range(len(pos)), pos, where='post', color='blue', lw=1.5)
+    ax3.axhline(0, color='black', lw=0.8, ls='--')
+    ax3.set_title("Position Amount")
+    ax3.set_ylabel("Quantity")
+    ax3.set_xlabel("Days")
+    ax3.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    return fig, np.sum(net_pnl)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trade traces from the cached position matrix.")
+    parser.add_argument("stocks", nargs="*", type=int, default=[STOCK_IDX], help="stock indices")
+    parser.add_argument("--all", action="store_true", help="trace every instrument")
+    parser.add_argument("--pdf", help="write all traces to one multi-page PDF instead of PNGs")
+    parser.add_argument("--days", type=int, default=LOOKBACK_DAYS, help="trace length in days")
+    args = parser.parse_args()
+
+    # Ensure the plots directory exists
+    if not os.path.exists(SAVE_DIR):
+        os.makedirs(SAVE_DIR)
+
+    # 1. Load Data and the full (instrument x day) position matrix
+    prices_full = price_data.load_prices(PRICES_PATH)
+    pos_full = load_positions(PRICES_PATH)
+    stocks = range(prices_full.shape[0]) if args.all else args.stocks
+
+    # 2. Render
+    if args.pdf:
+        with PdfPages(args.pdf) as pdf:
+            for stock in stocks:
+                fig, total = plot_trace(prices_full, pos_full, stock, args.days)
+                pdf.savefig(fig)
+                plt.close(fig)
+                print(f"Stock {stock}: Total Net PnL: {total:.2f}")
+        print(f"Traces saved to: {args.pdf}")
+    else:
+        for stock in stocks:
+            fig, total = plot_trace(prices_full, pos_full, stock, args.days)
+
+            # --- Save Logic ---
+            filename = f"stock_{stock}_trade_trace.png"
+            save_path = os.path.join(SAVE_DIR, filename)
+            fig.savefig(save_path, dpi=300, bbox_inches='tight')
+            print(f"Plot saved to: {save_path}")
+            print(f"Total Net PnL: {total:.2f}")
+            if len(stocks) > 1:
+                plt.close(fig)
+
+        if len(stocks) == 1:
+            plt.show()